@@ -1,5 +1,5 @@
+from src.constants import get_arg, watchlist_file
 from src.custom_logging import setup_logger
-from src.gui import main
 
 logger = setup_logger(__name__)
 
@@ -8,14 +8,27 @@ logger = setup_logger(__name__)
 # ------------------------------------------------------- #
 if __name__ == "__main__":
     try:
-        main()
-
-
+        if get_arg("RESUME"):
+            from src.start_app import resume
+            resume()
+        elif get_arg("DAEMON"):
+            from src.daemon import main
+            main()
+        elif get_arg("SYNC"):
+            from src.start_app import batch, load_batch_file
+            batch(load_batch_file(get_arg("WATCHLIST", watchlist_file)), sync=True)
+        elif get_arg("BATCH"):
+            from src.start_app import batch, load_batch_file
+            batch(load_batch_file(get_arg("BATCH")))
+        else:
+            from src.gui import main
+            main()
 
     except KeyboardInterrupt:
         logger.info("-----------------------------------------------------------")
         logger.info("            AnimeSerienScraper Stopped")
         logger.info("-----------------------------------------------------------")
+        logger.info("Unfinished downloads are kept in the job journal. Run with --resume to continue them.")
         logger.info("Downloads may still be running. Please don't close this Window until its done.")
         logger.info(
             "You will know its done once you see your primary prompt string. Example: C:\\XXX or username@hostname:")
@@ -1,3 +1,4 @@
+import os
 import sys
 import re
 
@@ -32,7 +33,13 @@ args_pattern = re.compile(
     r"((?:-l|--lang)\s(?P<LANG>Deutsch|Ger-Sub|English))|"
     r"((?:-m|--dl-mode)\s(?P<MODE>Series|Movies|All))|"
     r"((?:-s|--season_override)\s(?P<SEASON>\d+\+?))|"
-    r"((?:-p|--provider)\s(?P<PROVIDER>VOE|Streamtape|Vidoza))"
+    r"((?:-p|--provider)\s(?P<PROVIDER>VOE|Streamtape|Vidoza))|"
+    r"(--(?P<NO_CACHE>no-cache))|"
+    r"(--(?P<RESUME>resume))|"
+    r"(--batch\s(?P<BATCH>\S+))|"
+    r"(--(?P<DAEMON>daemon))|"
+    r"(--(?P<SYNC>sync))|"
+    r"(--watchlist\s(?P<WATCHLIST>\S+))"
     r")"
 )
 
@@ -66,12 +73,32 @@ dlMode = "Series"  # Standardwert
 season_override = "0"  # Standardwert
 cliProvider = "VOE"  # Standardwert
 episode_override = "0"  # Standardwert für manuelle Downloads
-ddos_protection_calc = 5
-ddos_wait_timer = 60  # in seconds
 max_download_threads = 5
-thread_download_wait_timer = 30  # in seconds
-disable_thread_timer = False
+max_resolve_threads = 4  # episodes resolved at the same time
+hedged_resolution = False  # race the cache url lookup of several providers per episode
+hedge_delay = 5.0  # in seconds without a cache url before the next provider starts in parallel
+segmented_download = False  # split direct MP4 downloads into parallel byte ranges
+download_connections = {"Vidoza": 4, "Streamtape": 4}  # connections per file in segmented mode
+native_hls = True  # download VOE segments in parallel instead of one ffmpeg process per stream
+hls_segment_workers = 6  # segments downloaded at the same time per HLS stream
+max_total_bandwidth = 0  # in bytes per second for all downloads together, 0 = unlimited (5 MiB/s = 5 * 1024 * 1024)
+progress_interval = 1.0  # in seconds between progress events of one download
+stall_min_rate = 100 * 1024  # in bytes per second, a slower download switches to the next provider, 0 = off
+stall_grace = 60  # in seconds a download may stay below stall_min_rate
+# Nachbearbeitung fertiger Downloads, läuft parallel zu den Downloads
+max_postprocess_workers = max(1, (os.cpu_count() or 2) // 2)  # ffmpeg jobs at the same time
+faststart = False  # move the mp4 index to the front so players can start before the file is read
+reencode_codec = None  # e.g. "libx265" to save space, None keeps the downloaded video stream
+reencode_crf = 28
+reencode_preset = "medium"
+loudnorm = False  # EBU R128 audio normalisation, re-encodes the audio to AAC
 output_root = "output"
+manifest_file = f"{output_root}/manifest.db"
+min_free_space = 2 * 1024 * 1024 * 1024  # in bytes that always stay free under output_root
+estimated_episode_size = 1024 * 1024 * 1024  # in bytes, reserved when the size of a stream is unknown
+disk_poll_interval = 30  # in seconds between free space checks while a job waits
+watchlist_file = "watchlist.json"  # same format as a --batch file
+watch_state_file = f"{output_root}/watchlist.db"
 output_name = name
 output_path = f"{output_root}/{type_of_media}/{output_name}"
 site_url = {
@@ -79,6 +106,40 @@ site_url = {
     "anime": "https://aniworld.to"
 }
 provider_priority = ["VOE", "Vidoza", "Streamtape"]
+adaptive_provider_order = True  # order providers per episode by measured success and throughput
+provider_stats_file = "cache/provider_stats.db"
+provider_stats_half_life = 3 * 24 * 60 * 60  # in seconds after which a measurement counts half
+# rate = requests per second, burst = requests allowed at once, max_in_flight = open connections per host
+host_rate_limits = {
+    "aniworld.to": {"rate": 0.5, "burst": 5, "max_in_flight": 4},
+    "s.to": {"rate": 0.5, "burst": 5, "max_in_flight": 4},
+    "voe": {"rate": 1.0, "burst": 5, "max_in_flight": 8},
+    "streamtape": {"rate": 1.0, "burst": 5, "max_in_flight": 8},
+    "vidoza": {"rate": 1.0, "burst": 5, "max_in_flight": 8},
+}
+default_rate_limit = {"rate": 5.0, "burst": 20, "max_in_flight": 8}  # e.g. the HLS segment CDNs
+page_timeout = 50  # in seconds
+# attempts = calls in total, the wait doubles from base_delay up to max_delay (in seconds) with jitter
+retry_policies = {
+    "http": {"attempts": 4, "base_delay": 1.0, "max_delay": 30.0},  # page and HEAD requests
+    "cache_url": {"attempts": 3, "base_delay": 2.0, "max_delay": 20.0},  # provider page without a cache url
+    "download": {"attempts": 3, "base_delay": 10.0, "max_delay": 120.0},  # whole downloads
+    "segment": {"attempts": 5, "base_delay": 1.0, "max_delay": 30.0},  # byte ranges and HLS segments
+}
+max_retry_after = 300  # in seconds, longer Retry-After headers are capped
+circuit_breaker_settings = {"failure_threshold": 5, "reset_timeout": 60}  # per host, reset_timeout in seconds
+disable_cache = False
+cache_file = "cache/page_cache.db"
+journal_file = "logs/journal.db"
+daemon_host = "127.0.0.1"  # only reachable from this machine
+daemon_port = 8765
+cache_ttl = {  # in seconds
+    "seasons": 24 * 60 * 60,
+    "episodes": 6 * 60 * 60,
+    "movies": 24 * 60 * 60,
+    "year": 30 * 24 * 60 * 60,
+    "providers": 6 * 60 * 60,
+}
 
 url = "{}/{}/stream/{}/".format(site_url[type_of_media], type_of_media, name)
 
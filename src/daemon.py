@@ -0,0 +1,313 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src import start_app
+from src.constants import (APP_VERSION, cliProvider, daemon_host, daemon_port, dlMode, episode_override, language,
+                           season_override, site_url, type_of_media)
+from src.custom_logging import setup_logger
+from src.logic.disk_space import disk_space
+from src.logic.journal import CANCELLED, journal
+from src.logic.postprocess import post_processor
+from src.logic.progress import progress_bus
+from src.logic.resolver import failover_for, resolve_all
+from src.logic.scheduler import download_scheduler
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                   definitions
+# ------------------------------------------------------- #
+SHOW_DEFAULTS = {"TYPE": type_of_media, "LANG": language, "MODE": dlMode, "SEASON": season_override,
+                 "EPISODE": episode_override, "PROVIDER": cliProvider}
+SHOW_KEYS = {"NAME"} | set(SHOW_DEFAULTS)
+ACTIVE_STATES = ("planned", "queued", "downloading", "paused")
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class JobRegistry:
+    """
+    State of every job the daemon has seen since it started, fed by the planner,
+    the scheduler futures and the progress bus.
+
+    States: planned, queued, downloading, paused, done, failed, cancelled.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.ids = {}
+        self.next_id = 1
+        self.started = time.time()
+        self.bytes_finished = 0
+
+    def add(self, job, show_name):
+        """
+        Returns:
+            job_id (Integer): id of the job, the existing one if the file is still active.
+            is_new (Boolean): False if the file is still active under job_id.
+        """
+        with self.lock:
+            if job.file_name in self.ids and self.jobs[self.ids[job.file_name]]["state"] in ACTIVE_STATES:
+                return self.ids[job.file_name], False
+            job_id = self.next_id
+            self.next_id += 1
+            self.ids[job.file_name] = job_id
+            self.jobs[job_id] = {"id": job_id, "show": show_name, "file_name": job.file_name,
+                                 "season": job.season, "episode": job.episode, "state": "planned",
+                                 "provider": None, "bytes_done": 0, "total": 0, "speed": 0.0, "eta": None,
+                                 "updated_at": time.time()}
+            return job_id, True
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def state(self, file_name):
+        with self.lock:
+            job = self.jobs.get(self.ids.get(file_name))
+            return job["state"] if job else None
+
+    def active(self):
+        with self.lock:
+            return {job["file_name"] for job in self.jobs.values() if job["state"] in ACTIVE_STATES}
+
+    def update(self, file_name, **values):
+        with self.lock:
+            job = self.jobs.get(self.ids.get(file_name))
+            if job is None:
+                return
+            job.update(values, updated_at=time.time())
+
+    def on_progress(self, event):
+        with self.lock:
+            job = self.jobs.get(self.ids.get(event.job_id))
+            if job is None:
+                return
+            job.update(bytes_done=event.bytes_done, total=event.total, speed=0.0 if event.finished else event.speed,
+                       eta=event.eta, updated_at=time.time())
+            if job["state"] == "queued":
+                job["state"] = "downloading"
+
+    def finished(self, file_name, future):
+        if future.cancelled():
+            state = "cancelled"
+        elif future.exception() is not None:
+            state = "failed"
+        else:
+            state = "done" if future.result() else "failed"
+        with self.lock:
+            job = self.jobs.get(self.ids.get(file_name))
+            if job is None:
+                return
+            if state == "failed" and job["state"] == "cancelled":
+                state = "cancelled"
+            if state == "done":
+                self.bytes_finished += job["bytes_done"]
+            job.update(state=state, speed=0.0, eta=None, updated_at=time.time())
+
+    def list(self, state=None):
+        with self.lock:
+            return [dict(job) for job in self.jobs.values() if state is None or job["state"] == state]
+
+    def stats(self):
+        with self.lock:
+            states = {}
+            for job in self.jobs.values():
+                states[job["state"]] = states.get(job["state"], 0) + 1
+            active = [job for job in self.jobs.values() if job["state"] == "downloading"]
+            return {
+                "uptime": time.time() - self.started,
+                "jobs": states,
+                "speed": sum(job["speed"] for job in active),
+                "bytes_downloaded": self.bytes_finished + sum(job["bytes_done"] for job in active),
+            }
+
+
+class Daemon:
+    """
+    Long running download service. Page cache, connection pools, rate limits and the
+    download scheduler stay warm between requests.
+    """
+
+    def __init__(self):
+        self.registry = JobRegistry()
+        # start_app plant über Modulvariablen, daher immer nur eine Show gleichzeitig
+        self.planner_lock = threading.Lock()
+        progress_bus.subscribe(self.registry.on_progress)
+
+    def enqueue(self, show_args):
+        """
+        Validate a show (or a single episode via SEASON and EPISODE) and plan, resolve and
+        download it in the background. The jobs show up in the registry once planned.
+
+        Raises:
+            ValueError: the arguments are invalid.
+        """
+        unknown = set(show_args) - SHOW_KEYS
+        if unknown:
+            raise ValueError(f"Unknown keys: {', '.join(sorted(unknown))}")
+        if not show_args.get("NAME"):
+            raise ValueError("NAME is required")
+        show_args = {key: str(value) for key, value in show_args.items()}
+        if show_args.get("TYPE", type_of_media) not in site_url:
+            raise ValueError(f"TYPE must be one of {', '.join(site_url)}")
+        # Das Planen lädt Seiten mit Rate-Limit, die HTTP-Anfrage wartet nicht darauf
+        threading.Thread(target=self._plan, args=(show_args,), name="daemon-plan", daemon=True).start()
+
+    def _plan(self, show_args):
+        try:
+            with self.planner_lock:
+                start_app.apply_args({**SHOW_DEFAULTS, **show_args})
+                # Laufende Dateien nicht erneut planen, already_downloaded() darf ihre Ausgabe nicht anfassen
+                requests = start_app.plan_show(skip=self.registry.active())
+                requests = [request for request in requests if self.registry.add(request[0], show_args["NAME"])[1]]
+        except Exception as e:
+            logger.error(f"Planning {show_args['NAME']} failed: {e}")
+            return
+        logger.info(f"Enqueued {len(requests)} downloads for {show_args['NAME']}.")
+        futures = self._resolve_and_submit(requests)
+        # Wie nach einem CLI-Lauf: fertige Jobs aus dem Journal entfernen, sonst wächst es im Dauerbetrieb
+        download_scheduler.wait(futures)
+        journal.prune_done()
+
+    def _resolve_and_submit(self, requests):
+        settings = {job.file_name: (job_site_url, job_language) for job, job_site_url, job_language, _ in requests}
+        resolved = set()
+        futures = []
+        for job, cache_url, provider in resolve_all(requests):
+            resolved.add(job.file_name)
+            if self.registry.state(job.file_name) == "cancelled":
+                journal.set_state(job.file_name, CANCELLED)
+                continue
+            self.registry.update(job.file_name, state="queued", provider=provider)
+            future = download_scheduler.submit(cache_url, job.file_name, provider,
+                                               failover=failover_for(job, *settings[job.file_name]))
+            future.add_done_callback(lambda done, file_name=job.file_name: self.registry.finished(file_name, done))
+            futures.append(future)
+        for job, _, _, _ in requests:
+            if job.file_name not in resolved and self.registry.state(job.file_name) == "planned":
+                self.registry.update(job.file_name, state="failed")
+        return futures
+
+    def control(self, job_id, action):
+        """
+        Pause, resume or cancel a job.
+
+        Returns:
+            job (Dict): state of the job after the action, None if the job is unknown.
+        """
+        job = self.registry.get(job_id)
+        if job is None:
+            return None
+        file_name = job["file_name"]
+        if action == "cancel":
+            if job["state"] in ACTIVE_STATES:
+                if not download_scheduler.cancel(file_name):
+                    # Noch in der Auflösung, wird vor dem Einreihen verworfen
+                    journal.set_state(file_name, CANCELLED)
+                self.registry.update(file_name, state="cancelled")
+        elif action == "pause":
+            if job["state"] in ("queued", "downloading"):
+                download_scheduler.pause(file_name)
+                self.registry.update(file_name, state="paused", speed=0.0)
+        elif action == "resume":
+            if job["state"] == "paused":
+                download_scheduler.resume(file_name)
+                self.registry.update(file_name, state="downloading")
+        else:
+            raise ValueError(f"Unknown action: {action}")
+        return self.registry.get(job_id)
+
+    def stats(self):
+        return dict(self.registry.stats(), scheduler=download_scheduler.stats(),
+                    postprocess=post_processor.stats(), disk=disk_space.stats())
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /jobs[?state=...]             list jobs
+    GET  /jobs/<id>                    one job
+    POST /jobs                         enqueue {"NAME": ..., "TYPE": ..., "LANG": ..., "MODE": ...,
+                                                "SEASON": ..., "EPISODE": ..., "PROVIDER": ...},
+                                       planned in the background, the jobs appear in GET /jobs
+    POST /jobs/<id>/pause|resume|cancel
+    GET  /stats                        queue and throughput
+    """
+
+    service = None
+
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+        parts = [part for part in path.split("/") if part]
+        if parts == ["jobs"]:
+            state = dict(item.partition("=")[::2] for item in query.split("&") if item).get("state")
+            self._send(200, {"jobs": self.service.registry.list(state)})
+        elif len(parts) == 2 and parts[0] == "jobs" and parts[1].isdigit():
+            job = self.service.registry.get(int(parts[1]))
+            self._send(200, job) if job else self._send(404, {"error": "unknown job"})
+        elif parts == ["stats"]:
+            self._send(200, self.service.stats())
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        parts = [part for part in self.path.split("?")[0].split("/") if part]
+        try:
+            if parts == ["jobs"]:
+                show_args = self._read_json()
+                self.service.enqueue(show_args)
+                self._send(202, {"show": show_args["NAME"], "state": "planning"})
+            elif len(parts) == 3 and parts[0] == "jobs" and parts[1].isdigit():
+                job = self.service.control(int(parts[1]), parts[2])
+                self._send(200, job) if job else self._send(404, {"error": "unknown job"})
+            else:
+                self._send(404, {"error": "not found"})
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            logger.error(f"Daemon request {self.path} failed: {e}")
+            self._send(500, {"error": str(e)})
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(body, dict):
+            raise ValueError("Body must be a JSON object")
+        return body
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug("Daemon: " + format % args)
+
+# ------------------------------------------------------- #
+#                       main
+# ------------------------------------------------------- #
+
+
+def main(host=daemon_host, port=daemon_port):
+    logger.info("-----------------------------------------------------------")
+    logger.info(f"            AnimeSerienScraper {APP_VERSION} daemon started")
+    logger.info("-----------------------------------------------------------")
+
+    start_app.check_environment()
+    RequestHandler.service = Daemon()
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    logger.info(f"Listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        download_scheduler.shutdown(wait_for_jobs=False)
@@ -14,6 +14,9 @@ from PyQt6.QtGui import QFont, QPalette, QColor, QPixmap, QIcon, QPainter, QLine
 # Configure logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
+from src.logic import http_client
+from src.logic.progress import format_bytes, progress_bus
+
 try:
     from src.start_app import main as start_app_main
 except ImportError as e:
@@ -52,7 +55,7 @@ class SplashScreen(QSplashScreen):
             # Lade das Bild von der URL
             logo_url = "https://beeimg.com/images/e94478500041.png"
             try:
-                response = requests.get(logo_url, timeout=5)
+                response = http_client.get(logo_url, timeout=5)
                 response.raise_for_status()  # Prüft, ob der Request erfolgreich war
                 self.logo = QPixmap()
                 self.logo.loadFromData(response.content)
@@ -126,19 +129,26 @@ class SearchSuggestionThread(QThread):
 
 class ScraperThread(QThread):
     progress = pyqtSignal(str)
+    download_progress = pyqtSignal(object)
     finished = pyqtSignal()
 
     def __init__(self, args):
         super().__init__()
         self.args = args
+        # PyQt liefert bei jedem Zugriff ein neues gebundenes Signal, unsubscribe braucht dasselbe Objekt
+        self._on_progress = self.download_progress.emit
 
     def run(self):
+        # Fortschritts-Events kommen aus den Download-Threads, das Signal bringt sie in den GUI-Thread
+        progress_bus.subscribe(self._on_progress)
         try:
             start_app_main(self.args)
             self.finished.emit()
         except Exception as e:
             self.progress.emit(f"Error: {str(e)}")
             logging.error(f"Error in ScraperThread: {e}")
+        finally:
+            progress_bus.unsubscribe(self._on_progress)
 
 class ModernSearchInput(QLineEdit):
     def __init__(self, parent=None, search_type="Anime"):
@@ -716,16 +726,34 @@ class ModernAniWorldGUI(QMainWindow):
         else:
             self.log_output.append(f"📥 Starte Download für: {name} - Staffel {args['SEASON']} Episode {args['EPISODE']}")
 
+        self.active_downloads = {}
         self.scraper_thread = ScraperThread(args)
         self.scraper_thread.progress.connect(self.update_log)
+        self.scraper_thread.download_progress.connect(self.update_progress)
         self.scraper_thread.finished.connect(self.download_finished)
         self.scraper_thread.start()
 
     def update_log(self, message):
         self.log_output.append(f"📝 {message}")
 
+    def update_progress(self, event):
+        if event.finished:
+            self.active_downloads.pop(event.job_id, None)
+        else:
+            self.active_downloads[event.job_id] = event
+        total = sum(download.total for download in self.active_downloads.values())
+        if not total:
+            self.progress_bar.setRange(0, 0)
+            return
+        done = sum(download.bytes_done for download in self.active_downloads.values())
+        speed = sum(download.speed for download in self.active_downloads.values())
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(min(int(done * 100 / total), 100))
+        self.progress_bar.setFormat(f"%p% - {len(self.active_downloads)} Downloads - {format_bytes(speed)}/s")
+
     def download_finished(self):
         self.download_button.setEnabled(True)
+        self.progress_bar.setFormat("%p%")
         self.progress_bar.setRange(0, 100)
         self.progress_bar.setValue(100)
         self.log_output.append("✅ Status: Download abgeschlossen")
@@ -0,0 +1,92 @@
+import heapq
+import itertools
+import threading
+import time
+
+from src.constants import max_total_bandwidth
+from src.custom_logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class BandwidthShaper:
+    """
+    Process-wide byte budget shared fairly between download jobs.
+
+    Every read of a job is tagged with a virtual finish time (self-clocked fair queueing)
+    and the reads are admitted in tag order from one token bucket. Each job that wants
+    more than its share gets the same number of bytes per second, no matter how many
+    connections it uses; a job that needs less leaves the rest to the others, and a
+    finished job stops taking part at once.
+
+    Parameters:
+        total_rate (Integer): bytes per second for all jobs together, 0 for unlimited.
+    """
+
+    def __init__(self, total_rate):
+        self.total_rate = total_rate
+        self.burst = max(total_rate // 4, 64 * 1024)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.virtual_time = 0.0
+        self.finish_tags = {}
+        self.waiting = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.total_rate)
+        self.updated = now
+
+    def consume(self, job_id, amount):
+        """
+        Block until the job may use amount more bytes.
+
+        Parameters:
+            job_id (String): download job the bytes belong to, usually its file name.
+            amount (Integer): number of bytes read.
+        """
+        if not self.total_rate:
+            return
+        with self.condition:
+            tag = max(self.virtual_time, self.finish_tags.get(job_id, 0.0)) + amount
+            self.finish_tags[job_id] = tag
+            entry = (tag, next(self.counter))
+            heapq.heappush(self.waiting, entry)
+            while True:
+                if self.waiting[0] == entry:
+                    self._refill()
+                    needed = min(amount, self.burst)
+                    if self.tokens >= needed:
+                        # Größere Lesevorgänge als der Burst dürfen den Eimer ins Minus ziehen
+                        self.tokens -= amount
+                        heapq.heappop(self.waiting)
+                        self.virtual_time = tag
+                        self.condition.notify_all()
+                        return
+                    self.condition.wait((needed - self.tokens) / self.total_rate)
+                else:
+                    self.condition.wait()
+
+    def fair_share(self):
+        """
+        Bytes per second each running job gets when all of them want more, None if unlimited.
+        """
+        if not self.total_rate:
+            return None
+        return self.total_rate / max(len(self.finish_tags), 1)
+
+    def finish_job(self, job_id):
+        with self.condition:
+            self.finish_tags.pop(job_id, None)
+
+
+# ------------------------------------------------------- #
+#                   global variables
+# ------------------------------------------------------- #
+bandwidth_shaper = BandwidthShaper(max_total_bandwidth)
@@ -1,58 +1,114 @@
-import urllib.request
-
 from bs4 import BeautifulSoup
 
 from src.custom_logging import setup_logger
+from src.logic.http_client import fetch_html
+from src.logic.page_cache import page_cache
+from src.logic.search_for_links import parse_year
 
 logger = setup_logger(__name__)
 
 
-def get_season(url_path):
-    logger.debug("Entered get_season.")
-    logger.debug("Site URL is: " + url_path)
+def count_seasons(soup):
     counter_seasons = 1
-    html_page = urllib.request.urlopen(url_path, timeout=50)
-    soup = BeautifulSoup(html_page, features="html.parser")
     for link in soup.findAll('a'):
         seasons = str(link.get("href"))
         if "/staffel-{}".format(counter_seasons) in seasons:
             counter_seasons = counter_seasons + 1
-    logger.debug("Now leaving Function get_season")
     return counter_seasons - 1
 
 
-def get_episodes(url_path, season_count):
-    logger.debug("Entered get_episodes")
-    url = "{}staffel-{}/".format(url_path, season_count)
+def count_episodes(soup, season_count):
     episode_count = 1
-    html_page = urllib.request.urlopen(url, timeout=50)
-    soup = BeautifulSoup(html_page, features="html.parser")
     for link in soup.findAll('a'):
         episode = str(link.get("href"))
         if "/staffel-{}/episode-{}".format(season_count, episode_count) in episode:
             episode_count = episode_count + 1
-    logger.debug("Now leaving Function get_episodes")
     return episode_count - 1
 
 
-def get_movies(url_path):
-    logger.debug("Entered get_movies")
-    url = "{}filme/".format(url_path)
+def count_movies(soup):
     movie_count = 1
-    html_page = urllib.request.urlopen(url, timeout=50)
-    soup = BeautifulSoup(html_page, features="html.parser")
     for link in soup.findAll('a'):
         movie = str(link.get("href"))
         if "/filme/film-{}".format(movie_count) in movie:
             movie_count = movie_count + 1
-    logger.debug("Now leaving Function get_movies")
     return movie_count - 1
 
+
 # ------------------------------------------------------- #
 #                      classes
 # ------------------------------------------------------- #
 
 
+class ShowMetadata:
+    """
+    Metadata of one show. The show page, the filme/ page and every staffel-N/ page
+    are downloaded and parsed at most once; every later lookup reuses the parse.
+    Values still valid in the page cache are not downloaded at all.
+
+    Parameters:
+        url_path (String): url of the show, ending with a slash.
+        use_cache (Boolean): False to read every value from the site; the page cache is still updated.
+    """
+
+    def __init__(self, url_path, use_cache=True):
+        self.url_path = url_path
+        self.use_cache = use_cache
+        self._soups = {}
+        self._seasons = None
+        self._year = None
+        self._movies = None
+        self._episodes = {}
+
+    def _get_soup(self, page):
+        if page not in self._soups:
+            url = self.url_path + page
+            logger.debug(f"Fetching show page {url}")
+            self._soups[page] = BeautifulSoup(fetch_html(url), features="html.parser")
+        return self._soups[page]
+
+    def _cached(self, url, page_type, compute):
+        if self.use_cache:
+            return page_cache.cached(url, page_type, compute)
+        value = compute()
+        # Wie page_cache.cached(): leere Ergebnisse nicht speichern
+        if value:
+            page_cache.set(url, page_type, value)
+        return value
+
+    @property
+    def seasons(self):
+        if self._seasons is None:
+            self._seasons = self._cached(self.url_path, "seasons", lambda: count_seasons(self._get_soup("")))
+        return self._seasons
+
+    @property
+    def year(self):
+        if self._year is None:
+            self._year = page_cache.get(self.url_path, "year")
+            if self._year is None:
+                self._year = parse_year(self._get_soup(""))
+                # Ein fehlgeschlagenes Parsen (0) wird nicht gecacht
+                if self._year:
+                    page_cache.set(self.url_path, "year", self._year)
+        return self._year
+
+    @property
+    def movies(self):
+        if self._movies is None:
+            url = self.url_path + "filme/"
+            self._movies = self._cached(url, "movies", lambda: count_movies(self._get_soup("filme/")))
+        return self._movies
+
+    def episodes(self, season):
+        season = int(season)
+        if season not in self._episodes:
+            page = "staffel-{}/".format(season)
+            self._episodes[season] = self._cached(self.url_path + page, "episodes",
+                                                  lambda: count_episodes(self._get_soup(page), season))
+        return self._episodes[season]
+
+
 # ------------------------------------------------------- #
 #                       main
 # ------------------------------------------------------- #
@@ -0,0 +1,117 @@
+import errno
+import os
+import shutil
+import subprocess
+import threading
+
+from src.constants import disk_poll_interval, min_free_space, output_root
+from src.custom_logging import setup_logger
+from src.logic.job_control import job_control
+from src.logic.progress import format_bytes, progress_bus
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                      functions
+# ------------------------------------------------------- #
+
+
+def is_disk_full(error):
+    if isinstance(error, OSError) and error.errno == errno.ENOSPC:
+        return True
+    # ffmpeg meldet eine volle Platte nur in stderr
+    return isinstance(error, subprocess.CalledProcessError) and "No space left on device" in (error.stderr or "")
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class DiskSpace:
+    """
+    Admission control for the output filesystem. A job reserves the bytes it is going to
+    write before it starts; if the free space minus all outstanding reservations would drop
+    below min_free, the job waits until downloads finish or space is freed outside the program.
+    The progress bus reports what a job has written, those bytes already count as used disk
+    and are no longer part of its outstanding reservation.
+
+    Parameters:
+        root (String): directory on the filesystem the downloads are written to.
+        min_free (Integer): bytes that always stay free.
+        poll_interval (Float): seconds between checks of the free space while a job waits.
+    """
+
+    def __init__(self, root, min_free, poll_interval=disk_poll_interval):
+        self.root = root
+        self.min_free = min_free
+        self.poll_interval = poll_interval
+        self.condition = threading.Condition()
+        self.reservations = {}
+        self.written = {}
+
+    def free(self):
+        root = self.root if os.path.exists(self.root) else "."
+        return shutil.disk_usage(root).free
+
+    def reserve(self, job_id, amount):
+        """
+        Reserve space for a job, replacing an earlier reservation of the same job.
+        Blocks until the space is available.
+
+        Parameters:
+            job_id (String): download job, usually its file name.
+            amount (Integer): bytes the job is still going to write.
+        """
+        amount = max(int(amount), 0)
+        warned = False
+        while True:
+            # Ohne Lock: ein pausierter Job blockiert hier, release() der anderen Jobs muss weiterlaufen
+            job_control.checkpoint(job_id)
+            with self.condition:
+                self.reservations.pop(job_id, None)
+                self.written.pop(job_id, None)
+                available = self.free() - self._outstanding() - self.min_free
+                if amount <= available:
+                    self.reservations[job_id] = amount
+                    logger.debug(f"Reserved {format_bytes(amount)} for {job_id}.")
+                    return
+                if not warned:
+                    logger.warning(f"Not enough disk space for {job_id}: needs {format_bytes(amount)}, "
+                                   f"{format_bytes(max(available, 0))} available. Waiting for free space.")
+                    warned = True
+                self.condition.wait(self.poll_interval)
+
+    def _outstanding(self):
+        # Geschriebene Bytes stecken schon in free(), sie dürfen nicht doppelt abgezogen werden
+        return sum(max(amount - self.written.get(job_id, 0), 0) for job_id, amount in self.reservations.items())
+
+    def on_progress(self, event):
+        if event.job_id not in self.reservations:
+            return
+        with self.condition:
+            if event.job_id in self.reservations:
+                self.written[event.job_id] = max(event.bytes_done - event.start_bytes, 0)
+
+    def wait_for_space(self, job_id):
+        # Nach einer vollen Platte: den noch offenen Teil der eigenen Reservierung erneut abwarten
+        with self.condition:
+            amount = max(self.reservations.get(job_id, 0) - self.written.get(job_id, 0), 0)
+        self.reserve(job_id, amount)
+
+    def release(self, job_id):
+        with self.condition:
+            self.written.pop(job_id, None)
+            if self.reservations.pop(job_id, None) is not None:
+                self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            reserved = self._outstanding()
+        return {"free": self.free(), "reserved": reserved, "min_free": self.min_free}
+
+
+# ------------------------------------------------------- #
+#                   global variables
+# ------------------------------------------------------- #
+disk_space = DiskSpace(output_root, min_free_space)
+progress_bus.subscribe(disk_space.on_progress)
@@ -1,177 +1,398 @@
+import json
 import os
-import platform
+import shutil
 import subprocess
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from os import path
-from threading import Thread
 import requests
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
+from src.constants import download_connections, estimated_episode_size, native_hls, segmented_download
 from src.custom_logging import setup_logger
 from src.failures import append_failure, remove_file
+from src.logic import http_client
+from src.logic.bandwidth import bandwidth_shaper
+from src.logic.disk_space import disk_space, is_disk_full
+from src.logic.progress import ProgressReporter
+from src.logic.ffmpeg import run_ffmpeg
+from src.logic.manifest import manifest
+from src.logic.hls import HlsUnsupported, download_hls, has_checkpoint, segment_dir_name
+from src.logic.job_control import DownloadStalled, JobCancelled, job_control
+from src.logic.rate_limiter import rate_limiter
+from src.logic.retry import download_retry, retry_after_of, segment_retry
 from src.successes import append_success
 
 logger = setup_logger(__name__)
 
-def create_session_with_retries():
-    session = requests.Session()
-    retries = Retry(
-        total=5,
-        backoff_factor=0.5,
-        status_forcelist=[500, 502, 503, 504, 520, 521, 522, 524]
-    )
-    session.mount('http://', HTTPAdapter(max_retries=retries))
-    session.mount('https://', HTTPAdapter(max_retries=retries))
-    return session
-
-def already_downloaded(file_name):
+# Videodateien nicht komprimiert anfordern, sonst passen Content-Length und Range nicht zu den Bytes auf der Platte
+IDENTITY_ENCODING = {"Accept-Encoding": "identity"}
+CHUNK_SIZE = 8192
+SEGMENT_SIZE = 16 * 1024 * 1024
+
+def already_downloaded(file_name, manifest_entries=None):
+    """
+    Decide whether an episode can be skipped.
+
+    Parameters:
+        file_name (String): target file of the episode.
+        manifest_entries (Dict): result of manifest.load_directory() for the folder of the file,
+            None to query the manifest for this file alone.
+    """
+    if manifest.lookup(file_name, manifest_entries) is not None:
+        logger.info("Episode {} already downloaded.".format(file_name))
+        return True
     if os.path.exists(file_name):
-        if os.path.getsize(file_name) > 0:
-            logger.info("Episode {} already downloaded.".format(file_name))
-            return True
-        else:
-            logger.debug("File exists but is empty. Removing and re-downloading: {}".format(file_name))
-            os.remove(file_name)
+        # Datei ohne Eintrag im Manifest (ältere Version oder von Hand abgelegt): gilt als fertig,
+        # geprüft wird im Hintergrund und nie gelöscht
+        logger.info("Episode {} already downloaded. Verifying it in the background.".format(file_name))
+        manifest.adopt_later(file_name)
+        return True
+    if os.path.exists(part_file_name(file_name)) or has_checkpoint(file_name):
+        logger.info("Found partial download of {}. Resuming it.".format(file_name))
+        return False
     logger.debug("File not downloaded. Downloading: {}".format(file_name))
     return False
 
-def download(link, file_name):
-    MAX_RETRIES = 3
-    CHUNK_SIZE = 8192
+def part_file_name(file_name):
+    return file_name + ".part"
+
+def read_part_meta(file_name):
+    try:
+        with open(part_file_name(file_name) + ".json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_part_meta(file_name, meta):
+    with open(part_file_name(file_name) + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+def remove_part(file_name):
+    for leftover in (part_file_name(file_name), part_file_name(file_name) + ".json"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+def resume_offset(file_name, validator, accepts_ranges):
+    """
+    Decide where an existing .part file can be continued.
+
+    Parameters:
+        file_name (String): final name of the file.
+        validator (Dict): {"etag": String, "total_size": Integer} of the remote file.
+        accepts_ranges (Boolean): server announced Accept-Ranges: bytes.
+
+    Returns:
+        offset (Integer): bytes already on disk that can be kept, 0 to start over.
+    """
+    part_file = part_file_name(file_name)
+    if not path.exists(part_file):
+        return 0
+    offset = path.getsize(part_file)
+    meta = read_part_meta(file_name)
+    # Segmentierte .part-Dateien sind vorab auf volle Größe angelegt und haben Lücken
+    if (not accepts_ranges or not same_remote_file(meta, validator) or "segments_done" in meta
+            or offset > validator["total_size"]):
+        logger.info("Partial download of {} can not be resumed. Starting over.".format(file_name))
+        remove_part(file_name)
+        return 0
+    return offset
+
+def part_bytes_kept(file_name, validator):
+    """
+    Bytes of an existing .part file that the next attempt keeps and does not write again.
+    """
+    part_file = part_file_name(file_name)
+    if not path.exists(part_file):
+        return 0
+    meta = read_part_meta(file_name)
+    if not same_remote_file(meta, validator):
+        return 0
+    if "segments_done" in meta:
+        # Vorab per truncate auf volle Größe angelegt, belegt sind nur die fertigen Segmente
+        if meta.get("segment_size") != SEGMENT_SIZE:
+            return 0
+        total_size = validator["total_size"]
+        return sum(max(min((index + 1) * SEGMENT_SIZE, total_size) - index * SEGMENT_SIZE, 0)
+                   for index in meta["segments_done"])
+    return path.getsize(part_file)
+
+def same_remote_file(meta, validator):
+    return (bool(validator["total_size"]) and meta.get("total_size") == validator["total_size"]
+            and (not validator["etag"] or meta.get("etag") == validator["etag"]))
+
+def download(link, file_name, provider=None):
+    MAX_RETRIES = download_retry.attempts
     retry_count = 0
-    session = create_session_with_retries()
+    part_file = part_file_name(file_name)
+    connections = download_connections.get(provider, 1) if segmented_download else 1
 
     while retry_count < MAX_RETRIES:
         try:
             logger.debug(f"Attempt {retry_count + 1}/{MAX_RETRIES} - Link: {link}, File: {file_name}")
+            job_control.checkpoint(file_name)
             
             # Überprüfe zuerst den Link
-            head_response = session.head(link, timeout=10)
+            head_response = http_client.head(link, timeout=10, headers=IDENTITY_ENCODING)
             if head_response.status_code != 200:
                 raise requests.RequestException(f"Invalid status code: {head_response.status_code}")
-            
-            # Starte den Download
-            with session.get(link, stream=True, timeout=30) as r:
-                r.raise_for_status()
-                total_size = int(r.headers.get('content-length', 0))
-                
-                with open(file_name, 'wb') as f:
-                    downloaded = 0
-                    for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            if total_size > 0:
-                                percent = (downloaded / total_size) * 100
-                                logger.debug(f"Download progress: {percent:.1f}%")
-                
-                if path.getsize(file_name) > 0:
-                    logger.success("Finished download of {}.".format(file_name))
-                    append_success(file_name)
-                    return True
-                else:
-                    raise Exception("Downloaded file is empty")
-                
+            validator = {
+                "etag": head_response.headers.get("ETag"),
+                "total_size": int(head_response.headers.get("content-length", 0)),
+            }
+            accepts_ranges = head_response.headers.get("Accept-Ranges", "").lower() == "bytes"
+            # Platz reservieren, bevor geschrieben wird; vorhandene Teile zählen schon zur belegten Platte
+            on_disk = part_bytes_kept(file_name, validator)
+            disk_space.reserve(file_name, (validator["total_size"] or estimated_episode_size) - on_disk)
+
+            if connections > 1 and accepts_ranges and validator["total_size"]:
+                download_segmented(link, file_name, validator, connections)
+            else:
+                download_sequential(link, file_name, validator, accepts_ranges)
+
+            part_size = path.getsize(part_file)
+            if part_size == 0:
+                raise Exception("Downloaded file is empty")
+            if validator["total_size"] and part_size != validator["total_size"]:
+                raise Exception(f"Download incomplete: {part_size} of {validator['total_size']} bytes")
+
+            os.replace(part_file, file_name)
+            remove_part(file_name)
+            # Reste eines HLS-Versuchs über einen anderen Provider
+            shutil.rmtree(segment_dir_name(file_name), ignore_errors=True)
+            manifest.record(file_name)
+            logger.success("Finished download of {}.".format(file_name))
+            append_success(file_name)
+            return True
+
+        except (JobCancelled, DownloadStalled):
+            raise
         except (requests.RequestException, Exception) as e:
+            if is_disk_full(e):
+                # Kein Versuch verbrauchen, die .part-Datei bleibt und wird fortgesetzt
+                logger.error(f"Disk full while downloading {file_name}.")
+                disk_space.wait_for_space(file_name)
+                continue
             retry_count += 1
             logger.warning(f"Download attempt {retry_count} failed: {str(e)}")
             
             if retry_count < MAX_RETRIES:
-                wait_time = 20 * retry_count
-                logger.info(f"Retrying in {wait_time} seconds...")
+                # Jitter verhindert, dass parallel gescheiterte Jobs gleichzeitig wiederkommen
+                wait_time = download_retry.delay(retry_count, retry_after_of(e))
+                logger.info(f"Retrying in {wait_time:.0f} seconds...")
                 time.sleep(wait_time)
             else:
+                # Die .part-Datei bleibt liegen und wird beim nächsten Lauf fortgesetzt
                 logger.error(f"Failed to download {file_name} after {MAX_RETRIES} attempts: {str(e)}")
                 append_failure(file_name)
-                remove_file(file_name)
                 return False
 
+def download_sequential(link, file_name, validator, accepts_ranges):
+    part_file = part_file_name(file_name)
+    offset = resume_offset(file_name, validator, accepts_ranges)
+    write_part_meta(file_name, validator)
+    if offset and offset == validator["total_size"]:
+        # Abbruch zwischen letztem Schreiben und Umbenennen: ein Range ab dem Ende beantwortet der Server mit 416
+        logger.info(f"{file_name} is already complete on disk.")
+        return
+
+    headers = dict(IDENTITY_ENCODING)
+    if offset:
+        logger.info(f"Resuming {file_name} at byte {offset}.")
+        headers["Range"] = f"bytes={offset}-"
+        if validator["etag"]:
+            headers["If-Range"] = validator["etag"]
+
+    # Starte den Download, die Verbindung belegt bis zum Ende einen Platz beim Host
+    with http_client.stream(link, timeout=30, headers=headers) as r:
+        r.raise_for_status()
+        if offset and r.status_code != 206:
+            # Server hat den Range ignoriert, die Datei kommt komplett
+            logger.info(f"Server sent the whole file again. Restarting {file_name}.")
+            offset = 0
+        elif offset and not r.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+            raise requests.RequestException(f"Unexpected Content-Range: {r.headers.get('Content-Range')}")
+        total_size = offset + int(r.headers.get('content-length', 0))
+        progress = ProgressReporter(file_name, total=total_size, bytes_done=offset)
+
+        with open(part_file, 'ab' if offset else 'wb') as f:
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                if chunk:
+                    job_control.checkpoint(file_name)
+                    bandwidth_shaper.consume(file_name, len(chunk))
+                    f.write(chunk)
+                    progress.update(len(chunk))
+    progress.finish()
+
+def download_segmented(link, file_name, validator, connections):
+    """
+    Download a file as byte ranges over several connections into a preallocated .part file.
+    Finished segments are recorded in the .part meta file, so a retry only fetches the rest.
+
+    Parameters:
+        link (String): direct link of the file.
+        file_name (String): final name of the file.
+        validator (Dict): {"etag": String, "total_size": Integer} of the remote file.
+        connections (Integer): number of parallel connections.
+    """
+    part_file = part_file_name(file_name)
+    total_size = validator["total_size"]
+    segments = [(start, min(start + SEGMENT_SIZE, total_size) - 1) for start in range(0, total_size, SEGMENT_SIZE)]
+
+    done = set()
+    meta = read_part_meta(file_name)
+    if path.exists(part_file) and same_remote_file(meta, validator):
+        if meta.get("segment_size") == SEGMENT_SIZE:
+            done = set(meta.get("segments_done", []))
+        elif "segments_done" not in meta:
+            # Vorhandener Anfang eines normalen Downloads zählt als fertige Segmente
+            offset = path.getsize(part_file)
+            done = {index for index, (start, end) in enumerate(segments) if end < offset}
+    else:
+        remove_part(file_name)
+
+    with open(part_file, "ab") as f:
+        f.truncate(total_size)
+    meta = dict(validator, segment_size=SEGMENT_SIZE, segments_done=sorted(done))
+    write_part_meta(file_name, meta)
+    meta_lock = threading.Lock()
+
+    def fetch_segment(index):
+        start, end = segments[index]
+        for attempt in range(1, segment_retry.attempts + 1):
+            try:
+                headers = dict(IDENTITY_ENCODING, Range=f"bytes={start}-{end}")
+                written = 0
+                with http_client.stream(link, timeout=30, headers=headers) as r:
+                    r.raise_for_status()
+                    if r.status_code != 206:
+                        raise requests.RequestException("Server ignored the Range header")
+                    with open(part_file, "r+b") as f:
+                        f.seek(start)
+                        for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                            if chunk:
+                                job_control.checkpoint(file_name)
+                                bandwidth_shaper.consume(file_name, len(chunk))
+                                f.write(chunk)
+                                written += len(chunk)
+                                progress.update(len(chunk))
+                if written != end - start + 1:
+                    raise Exception(f"Segment {index} incomplete: {written} of {end - start + 1} bytes")
+                with meta_lock:
+                    done.add(index)
+                    meta["segments_done"] = sorted(done)
+                    write_part_meta(file_name, meta)
+                return
+            except (JobCancelled, DownloadStalled):
+                raise
+            except Exception as e:
+                logger.warning(f"Segment {index} of {file_name} attempt {attempt} failed: {e}")
+                if attempt == segment_retry.attempts:
+                    raise
+                time.sleep(segment_retry.delay(attempt, retry_after_of(e)))
+
+    pending = [index for index in range(len(segments)) if index not in done]
+    done_bytes = sum(segments[index][1] - segments[index][0] + 1 for index in done)
+    progress = ProgressReporter(file_name, total=total_size, bytes_done=done_bytes)
+    logger.info(f"Downloading {len(pending)} of {len(segments)} segments of {file_name} "
+                f"over {connections} connections.")
+    with ThreadPoolExecutor(max_workers=connections, thread_name_prefix="segment") as executor:
+        for future in as_completed([executor.submit(fetch_segment, index) for index in pending]):
+            future.result()
+    progress.finish()
+
 def download_and_convert_hls_stream(hls_url, file_name):
-    MAX_RETRIES = 3
+    MAX_RETRIES = download_retry.attempts
     retry_count = 0
-    
-    # Finde den FFmpeg-Pfad
-    if path.exists("ffmpeg.exe"):
-        ffmpeg_path = "ffmpeg.exe"
-    elif path.exists("src/ffmpeg.exe"):
-        ffmpeg_path = "src/ffmpeg.exe"
-    else:
-        ffmpeg_path = "ffmpeg"
+    use_native_hls = native_hls
+    expected_duration = None
 
     while retry_count < MAX_RETRIES:
         try:
+            job_control.checkpoint(file_name)
             # Überprüfe zuerst die HLS-URL
-            session = create_session_with_retries()
-            response = session.head(hls_url, timeout=10)
+            response = http_client.head(hls_url, timeout=10)
             if response.status_code != 200:
                 raise requests.RequestException(f"Invalid HLS URL status: {response.status_code}")
 
-            # FFmpeg-Befehl mit zusätzlichen Optionen für bessere Stabilität
-            ffmpeg_cmd = [
-                ffmpeg_path,
-                '-y',  # Überschreibe existierende Dateien
-                '-reconnect', '1',
-                '-reconnect_streamed', '1',
-                '-reconnect_delay_max', '30',
-                '-i', hls_url,
-                '-c', 'copy',
-                '-bsf:a', 'aac_adtstoasc',
-                file_name
-            ]
-
-            if platform.system() == "Windows":
-                process = subprocess.run(
-                    ffmpeg_cmd,
-                    check=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    encoding='utf-8'
-                )
-            else:
-                process = subprocess.run(
-                    ffmpeg_cmd,
-                    check=True,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL
-                )
+            if use_native_hls:
+                try:
+                    # Segmente parallel laden und lokal remuxen
+                    expected_duration = download_hls(hls_url, file_name)
+                except HlsUnsupported as e:
+                    logger.info(f"{e}. Falling back to ffmpeg for {file_name}.")
+                    use_native_hls = False
+
+            if not use_native_hls:
+                # FFmpeg-Befehl mit zusätzlichen Optionen für bessere Stabilität
+                ffmpeg_args = [
+                    '-y',  # Überschreibe existierende Dateien
+                    '-reconnect', '1',
+                    '-reconnect_streamed', '1',
+                    '-reconnect_delay_max', '30',
+                    '-i', hls_url,
+                    '-c', 'copy',
+                    '-bsf:a', 'aac_adtstoasc',
+                    file_name
+                ]
+
+                # Die Größe ist vorab unbekannt
+                disk_space.reserve(file_name, estimated_episode_size)
+                # FFmpeg holt die Segmente selbst; wie bei stream() zählt nur der Verbindungsaufbau
+                rate_limiter.bucket_for(hls_url).take()
+                run_ffmpeg(ffmpeg_args, job_id=file_name)
 
             # Überprüfe die Ausgabedatei
             if path.exists(file_name) and path.getsize(file_name) > 0:
+                manifest.record(file_name, expected_duration)
+                # Reste eines direkten Downloads über einen anderen Provider
+                remove_part(file_name)
                 logger.success("Finished download of {}.".format(file_name))
                 append_success(file_name)
                 return True
             else:
                 raise Exception("Output file is empty or missing")
 
+        except (JobCancelled, DownloadStalled):
+            raise
         except (subprocess.CalledProcessError, requests.RequestException, Exception) as e:
+            if is_disk_full(e):
+                # Geprüfte Segmente bleiben liegen, nach dem Warten geht es dort weiter
+                logger.error(f"Disk full while downloading {file_name}.")
+                disk_space.wait_for_space(file_name)
+                continue
             retry_count += 1
             logger.warning(f"HLS download attempt {retry_count} failed: {str(e)}")
             
             if retry_count < MAX_RETRIES:
-                wait_time = 20 * retry_count
-                logger.info(f"Retrying in {wait_time} seconds...")
+                # Jitter verhindert, dass parallel gescheiterte Jobs gleichzeitig wiederkommen
+                wait_time = download_retry.delay(retry_count, retry_after_of(e))
+                logger.info(f"Retrying in {wait_time:.0f} seconds...")
                 time.sleep(wait_time)
             else:
+                # Geprüfte Segmente bleiben mit ihrem Checkpoint liegen und werden beim nächsten Lauf weiterverwendet
                 logger.error(f"Failed to download {file_name} after {MAX_RETRIES} attempts: {str(e)}")
                 append_failure(file_name)
                 remove_file(file_name)
                 return False
 
-def create_new_download_thread(url, file_name, provider) -> Thread:
-    logger.debug("Creating new download thread.")
-    
+def start_download(url, file_name, provider):
+    logger.debug("Starting download worker.")
+
     # Stelle sicher, dass der Ausgabeordner existiert
     os.makedirs(os.path.dirname(file_name), exist_ok=True)
-    
-    if provider in ["Vidoza", "Streamtape"]:
-        t = Thread(target=download, args=(url, file_name))
-    elif provider == "VOE":
-        t = Thread(target=download_and_convert_hls_stream, args=(url, file_name))
-    else:
+
+    try:
+        if provider in ["Vidoza", "Streamtape"]:
+            return download(url, file_name, provider)
+        elif provider == "VOE":
+            return download_and_convert_hls_stream(url, file_name)
         logger.error(f"Unknown provider: {provider}")
-        return None
-        
-    t.daemon = True  # Beende Thread, wenn Hauptprogramm beendet wird
-    t.start()
-    logger.loading("Provider {} - File {} added to queue.".format(provider, file_name))
-    return t
+        return False
+    except JobCancelled:
+        # Teilstücke bleiben liegen, ein neuer Auftrag setzt dort fort
+        logger.info(f"Download of {file_name} cancelled.")
+        return False
+    finally:
+        # Der Anteil an der Bandbreite und der reservierte Platz gehen an die übrigen Downloads
+        bandwidth_shaper.finish_job(file_name)
+        disk_space.release(file_name)
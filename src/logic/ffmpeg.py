@@ -0,0 +1,178 @@
+import json
+import shutil
+import subprocess
+import threading
+from collections import deque
+from os import path
+
+from src.custom_logging import setup_logger
+from src.logic.progress import ProgressReporter
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                   definitions
+# ------------------------------------------------------- #
+STDERR_LINES = 50
+
+# ------------------------------------------------------- #
+#                      functions
+# ------------------------------------------------------- #
+
+
+def find_ffmpeg():
+    # Finde den FFmpeg-Pfad
+    if path.exists("ffmpeg.exe"):
+        return "ffmpeg.exe"
+    elif path.exists("src/ffmpeg.exe"):
+        return "src/ffmpeg.exe"
+    return "ffmpeg"
+
+
+def find_ffprobe():
+    if path.exists("ffprobe.exe"):
+        return "ffprobe.exe"
+    elif path.exists("src/ffprobe.exe"):
+        return "src/ffprobe.exe"
+    return "ffprobe"
+
+
+def probe(file_name):
+    """
+    Read duration and container of a media file.
+
+    Returns:
+        (duration, container): duration in seconds or None, container name or None.
+        None if ffprobe is not available.
+    """
+    try:
+        result = subprocess.run(
+            [find_ffprobe(), '-v', 'error', '-show_entries', 'format=duration,format_name', '-of', 'json', file_name],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, encoding='utf-8', errors='replace', timeout=60
+        )
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return None
+    try:
+        media_format = json.loads(result.stdout or "{}").get("format", {})
+    except ValueError:
+        media_format = {}
+    try:
+        duration = float(media_format.get("duration"))
+    except (TypeError, ValueError):
+        duration = None
+    return duration, media_format.get("format_name")
+
+
+def parse_out_time(progress):
+    # out_time_us und out_time_ms sind beide Mikrosekunden
+    for key in ("out_time_us", "out_time_ms"):
+        if progress.get(key, "N/A").lstrip("-").isdigit():
+            return int(progress[key]) / 1_000_000
+    try:
+        hours, minutes, seconds = progress.get("out_time", "").split(":")
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except ValueError:
+        return None
+
+
+def parse_speed(progress):
+    try:
+        return float(progress.get("speed", "N/A").rstrip("x"))
+    except ValueError:
+        return None
+
+
+def run_ffmpeg(ffmpeg_args, job_id=None, duration=None, input_files=None):
+    """
+    Run ffmpeg with -progress on stdout and report its progress while it runs.
+    Only the last STDERR_LINES lines of stderr are kept for error messages.
+
+    Parameters:
+        ffmpeg_args (List): arguments after the ffmpeg binary.
+        job_id (String): download job to publish progress events for, None for no events.
+        duration (Float): length of the media in seconds if known, used to estimate the total size.
+        input_files (List): files piped into ffmpeg's stdin one after another.
+
+    Raises:
+        subprocess.CalledProcessError: ffmpeg failed, stderr holds its last lines.
+    """
+    ffmpeg_cmd = [find_ffmpeg(), '-hide_banner', '-nostats', '-progress', 'pipe:1'] + ffmpeg_args
+    process = subprocess.Popen(
+        ffmpeg_cmd,
+        stdin=subprocess.PIPE if input_files else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding='utf-8',
+        errors='replace'
+    )
+    stderr_tail = deque(maxlen=STDERR_LINES)
+
+    def read_stderr():
+        for line in process.stderr:
+            stderr_tail.append(line.rstrip())
+
+    def feed_stdin():
+        try:
+            for input_file in input_files:
+                with open(input_file, "rb") as f:
+                    shutil.copyfileobj(f, process.stdin.buffer)
+        except (BrokenPipeError, OSError):
+            logger.warning("ffmpeg closed its input early.")
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    helpers = [threading.Thread(target=read_stderr, daemon=True)]
+    if input_files:
+        helpers.append(threading.Thread(target=feed_stdin, daemon=True))
+    for helper in helpers:
+        helper.start()
+
+    reporter = ProgressReporter(job_id) if job_id else None
+    progress = {}
+    for line in process.stdout:
+        key, _, value = line.strip().partition("=")
+        progress[key] = value
+        if key != "progress":
+            continue
+        # Ein Block ist vollständig
+        if reporter and progress.get("total_size", "N/A").isdigit():
+            total_size = int(progress["total_size"])
+            out_time = parse_out_time(progress)
+            if duration and out_time:
+                reporter.total = int(total_size * duration / out_time)
+            reporter.set(total_size)
+        logger.debug(f"ffmpeg {job_id or ''}: out_time={progress.get('out_time')} "
+                     f"total_size={progress.get('total_size')} speed={parse_speed(progress)}x")
+        progress = {}
+
+    return_code = process.wait()
+    for helper in helpers:
+        helper.join()
+    if reporter:
+        reporter.finish()
+    if return_code != 0:
+        stderr = "\n".join(stderr_tail)
+        logger.warning(f"ffmpeg exited with {return_code}:\n{stderr}")
+        raise subprocess.CalledProcessError(return_code, ffmpeg_cmd, stderr=stderr)
+
+
+def remux_segments(segment_files, file_name):
+    """
+    Join local MPEG-TS segments into an mp4 without re-encoding. The segments are
+    piped into ffmpeg one after another, which is the same byte stream the server sent.
+
+    Parameters:
+        segment_files (List): segment files in playback order.
+        file_name (String): mp4 to create.
+    """
+    run_ffmpeg([
+        '-y',
+        '-f', 'mpegts',
+        '-i', 'pipe:0',
+        '-c', 'copy',
+        '-bsf:a', 'aac_adtstoasc',
+        file_name
+    ], input_files=segment_files)
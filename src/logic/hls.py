@@ -0,0 +1,280 @@
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
+
+from src.constants import hls_segment_workers
+from src.custom_logging import setup_logger
+from src.logic import http_client
+from src.logic.bandwidth import bandwidth_shaper
+from src.logic.disk_space import disk_space
+from src.logic.ffmpeg import remux_segments
+from src.logic.job_control import DownloadStalled, JobCancelled, job_control
+from src.logic.progress import ProgressReporter
+from src.logic.retry import retry_after_of, segment_retry
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                   definitions
+# ------------------------------------------------------- #
+CHUNK_SIZE = 64 * 1024
+TS_SYNC_BYTE = 0x47
+CHECKPOINT_FILE = "checkpoint.json"
+
+# ------------------------------------------------------- #
+#                      functions
+# ------------------------------------------------------- #
+
+
+def parse_attributes(line):
+    # KEY=VALUE,KEY="VALUE, with comma"
+    attributes = {}
+    key, value, in_quotes = "", "", False
+    reading_key = True
+    for char in line.split(":", 1)[1] + ",":
+        if reading_key:
+            if char == "=":
+                reading_key = False
+            else:
+                key += char
+        elif char == '"':
+            in_quotes = not in_quotes
+        elif char == "," and not in_quotes:
+            attributes[key.strip()] = value
+            key, value, reading_key = "", "", True
+        else:
+            value += char
+    return attributes
+
+
+def parse_playlist(text, base_url):
+    """
+    Parse a master or media playlist.
+
+    Returns:
+        playlist (Dict): {"variants": [(bandwidth, url)]} for a master playlist,
+            {"segments": [(sequence, duration, url)], "unsupported": String or None} for a media playlist.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines or lines[0] != "#EXTM3U":
+        raise HlsUnsupported("Not an m3u8 playlist")
+
+    variants = []
+    segments = []
+    unsupported = None
+    sequence = 0
+    duration = 0.0
+    pending_variant = None
+    for line in lines[1:]:
+        if line.startswith("#EXT-X-STREAM-INF"):
+            pending_variant = int(parse_attributes(line).get("BANDWIDTH", 0))
+        elif line.startswith("#EXT-X-MEDIA-SEQUENCE"):
+            sequence = int(line.split(":", 1)[1])
+        elif line.startswith("#EXTINF"):
+            duration = float(line.split(":", 1)[1].split(",")[0])
+        elif line.startswith("#EXT-X-KEY") and parse_attributes(line).get("METHOD", "NONE") != "NONE":
+            unsupported = "Encrypted HLS stream"
+        elif line.startswith("#EXT-X-MAP"):
+            unsupported = "fMP4 HLS stream"
+        elif line.startswith("#EXT-X-BYTERANGE"):
+            unsupported = "Byte range HLS stream"
+        elif line.startswith("#EXT-X-MEDIA") and "TYPE=AUDIO" in line and "URI=" in line:
+            unsupported = "HLS stream with separate audio"
+        elif line.startswith("#"):
+            continue
+        elif pending_variant is not None:
+            variants.append((pending_variant, urljoin(base_url, line)))
+            pending_variant = None
+        else:
+            segments.append((sequence, duration, urljoin(base_url, line)))
+            sequence += 1
+
+    if variants:
+        return {"variants": variants, "unsupported": unsupported}
+    return {"segments": segments, "unsupported": unsupported}
+
+
+def load_media_playlist(hls_url):
+    """
+    Fetch the playlist and follow a master playlist to its best variant.
+
+    Returns:
+        (segments, bandwidth): (sequence, duration, url) of every media segment and the
+            bandwidth of the variant in bits per second, 0 if the playlist does not name it.
+    """
+    bandwidth = 0
+    response = http_client.get(hls_url)
+    response.raise_for_status()
+    playlist = parse_playlist(response.text, response.url)
+    if "variants" in playlist:
+        if playlist["unsupported"]:
+            raise HlsUnsupported(playlist["unsupported"])
+        bandwidth, variant_url = max(playlist["variants"])
+        logger.debug(f"Using HLS variant with bandwidth {bandwidth}: {variant_url}")
+        response = http_client.get(variant_url)
+        response.raise_for_status()
+        playlist = parse_playlist(response.text, response.url)
+    if playlist["unsupported"]:
+        raise HlsUnsupported(playlist["unsupported"])
+    if not playlist["segments"]:
+        raise HlsUnsupported("HLS playlist without segments")
+    return playlist["segments"], bandwidth
+
+
+def segment_dir_name(file_name):
+    return file_name + ".hls"
+
+
+def segment_file_name(segment_dir, sequence):
+    return os.path.join(segment_dir, f"{sequence:08d}.ts")
+
+
+def fetch_segment(url, target, job_id, progress=None):
+    for attempt in range(1, segment_retry.attempts + 1):
+        try:
+            temp_target = target + ".tmp"
+            size = 0
+            with http_client.stream(url, timeout=30) as response:
+                response.raise_for_status()
+                expected_size = response.headers.get("content-length")
+                compressed = "content-encoding" in response.headers
+                with open(temp_target, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        if chunk:
+                            job_control.checkpoint(job_id)
+                            bandwidth_shaper.consume(job_id, len(chunk))
+                            f.write(chunk)
+                            size += len(chunk)
+                            if progress:
+                                progress.update(len(chunk))
+            if not size:
+                raise Exception("Empty segment")
+            if expected_size and not compressed and int(expected_size) != size:
+                raise Exception(f"Segment truncated: {size} of {expected_size} bytes")
+            os.replace(temp_target, target)
+            return size
+        except (JobCancelled, DownloadStalled):
+            raise
+        except Exception as e:
+            logger.debug(f"Segment {url} attempt {attempt} failed: {e}")
+            if attempt == segment_retry.attempts:
+                raise
+            time.sleep(segment_retry.delay(attempt, retry_after_of(e)))
+
+
+def stream_fingerprint(segments):
+    # Neue Cache-URLs ändern Token, aber nicht Anzahl und Länge der Segmente
+    return {"count": len(segments), "first_sequence": segments[0][0],
+            "duration": round(sum(duration for _, duration, _ in segments), 3)}
+
+
+def load_checkpoint(segment_dir, segments):
+    """
+    Read the checkpoint of an earlier attempt or run.
+
+    Returns:
+        verified (Dict): {sequence: size} of segments that are on disk with the recorded size.
+    """
+    try:
+        with open(os.path.join(segment_dir, CHECKPOINT_FILE), "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if checkpoint.get("stream") != stream_fingerprint(segments):
+        logger.info(f"Checkpoint in {segment_dir} belongs to a different stream. Starting over.")
+        return {}
+    verified = {}
+    for sequence, size in checkpoint.get("segments", {}).items():
+        segment_file = segment_file_name(segment_dir, int(sequence))
+        if os.path.exists(segment_file) and os.path.getsize(segment_file) == size:
+            verified[int(sequence)] = size
+    return verified
+
+
+def save_checkpoint(segment_dir, segments, verified):
+    checkpoint_file = os.path.join(segment_dir, CHECKPOINT_FILE)
+    with open(checkpoint_file + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"stream": stream_fingerprint(segments),
+                   "segments": {str(sequence): size for sequence, size in verified.items()}}, f)
+    os.replace(checkpoint_file + ".tmp", checkpoint_file)
+
+
+def has_checkpoint(file_name):
+    return os.path.exists(os.path.join(segment_dir_name(file_name), CHECKPOINT_FILE))
+
+
+def download_hls(hls_url, file_name, workers=hls_segment_workers):
+    """
+    Download all segments of an HLS stream in parallel and remux them into file_name.
+    Verified segments are recorded in a checkpoint next to them, so a retry or a new
+    run only downloads the segments that are still missing.
+
+    Parameters:
+        hls_url (String): url of the master or media playlist.
+        file_name (String): mp4 to create.
+        workers (Integer): segments downloaded at the same time.
+
+    Returns:
+        duration (Float): length of the stream according to the playlist.
+
+    Raises:
+        HlsUnsupported: the stream needs ffmpeg's own HLS demuxer.
+    """
+    segments, bandwidth = load_media_playlist(hls_url)
+    duration = sum(segment_duration for _, segment_duration, _ in segments)
+    segment_dir = segment_dir_name(file_name)
+    os.makedirs(segment_dir, exist_ok=True)
+    verified = load_checkpoint(segment_dir, segments)
+    checkpoint_lock = threading.Lock()
+    progress = ProgressReporter(file_name, bytes_done=sum(verified.values()))
+
+    def fetch_and_record(sequence, url):
+        size = fetch_segment(url, segment_file_name(segment_dir, sequence), file_name, progress)
+        with checkpoint_lock:
+            verified[sequence] = size
+            save_checkpoint(segment_dir, segments, verified)
+            # Gesamtgröße aus der mittleren Segmentgröße schätzen
+            progress.total = int(sum(verified.values()) / len(verified) * len(segments))
+
+    # Erstes Segment vorab prüfen, bevor alles geladen wird
+    first_sequence, _, first_url = segments[0]
+    if first_sequence not in verified:
+        fetch_and_record(first_sequence, first_url)
+    with open(segment_file_name(segment_dir, first_sequence), "rb") as f:
+        if f.read(1) != bytes([TS_SYNC_BYTE]):
+            shutil.rmtree(segment_dir, ignore_errors=True)
+            raise HlsUnsupported("HLS segments are not MPEG-TS")
+
+    # Größe aus Bitrate x Dauer, sonst aus dem ersten Segment hochgerechnet
+    if bandwidth:
+        estimate = int(bandwidth / 8 * duration)
+    else:
+        first_duration = segments[0][1] or duration / len(segments)
+        estimate = int(verified[first_sequence] / first_duration * duration) if first_duration else 0
+    # Segmente und fertige mp4 liegen bis zum Remux gleichzeitig auf der Platte
+    disk_space.reserve(file_name, 2 * estimate - sum(verified.values()))
+
+    pending = [(sequence, url) for sequence, _, url in segments if sequence not in verified]
+    logger.info(f"Downloading {len(pending)} of {len(segments)} HLS segments of {file_name}.")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hls") as executor:
+        futures = [executor.submit(fetch_and_record, sequence, url) for sequence, url in pending]
+        for future in as_completed(futures):
+            future.result()
+    progress.finish()
+
+    remux_segments([segment_file_name(segment_dir, sequence) for sequence, _, _ in segments], file_name)
+    shutil.rmtree(segment_dir, ignore_errors=True)
+    return duration
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class HlsUnsupported(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
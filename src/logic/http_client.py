@@ -0,0 +1,127 @@
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+
+from src.constants import (default_rate_limit, download_connections, hls_segment_workers, host_rate_limits,
+                           max_download_threads, page_timeout)
+from src.custom_logging import setup_logger
+from src.logic.rate_limiter import rate_limiter
+from src.logic.retry import RETRY_STATUS, circuit_breakers, http_retry, retry_call
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class RetryableStatus(requests.RequestException):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+# ------------------------------------------------------- #
+#                      functions
+# ------------------------------------------------------- #
+
+
+def create_session():
+    session = requests.Session()
+    # Wiederholungen übernimmt src.logic.retry, urllib3 versucht jede Anfrage nur einmal
+    # Ein Pool pro Host, groß genug für alle erlaubten gleichzeitigen Anfragen und Übertragungen
+    transfers = max_download_threads * max([hls_segment_workers] + list(download_connections.values()))
+    pool_maxsize = max([limit["max_in_flight"] for limit in host_rate_limits.values()]
+                       + [default_rate_limit["max_in_flight"], transfers])
+    adapter = HTTPAdapter(max_retries=0, pool_connections=len(host_rate_limits) + 4,
+                          pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    # gzip/deflate, und br wenn Brotli installiert ist
+    session.headers.update({"Accept-Encoding": DEFAULT_ACCEPT_ENCODING})
+    return session
+
+
+def request(method, url, timeout=page_timeout, **kwargs):
+    """
+    Send a request through the rate limiter and the circuit breaker of the host. Connection
+    errors, timeouts and retryable status codes are retried with the http policy, honouring
+    Retry-After; after the last attempt the retryable response is returned to the caller.
+
+    Raises:
+        CircuitOpen: the host failed too often and is skipped for now.
+        requests.RequestException: the request could not be sent in any attempt.
+    """
+    breaker = circuit_breakers.breaker_for(url)
+
+    def attempt():
+        breaker.check()
+        with rate_limiter.limit(url):
+            try:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+            except Exception:
+                breaker.failure()
+                raise
+        if response.status_code in RETRY_STATUS:
+            breaker.failure()
+            raise RetryableStatus(f"{response.status_code} from {url}", response=response)
+        breaker.success()
+        return response
+
+    try:
+        return retry_call(attempt, http_retry, retry_on=(requests.ConnectionError, requests.Timeout, RetryableStatus),
+                          description=f"{method} {url}")
+    except RetryableStatus as e:
+        return e.response
+
+
+def get(url, timeout=page_timeout, **kwargs):
+    return request("GET", url, timeout=timeout, **kwargs)
+
+
+def head(url, timeout=10, **kwargs):
+    return request("HEAD", url, timeout=timeout, **kwargs)
+
+
+@contextmanager
+def stream(url, timeout=30, **kwargs):
+    """
+    Streaming GET. Only the connection setup takes a rate limiter slot, the body transfer
+    does not, so long downloads never block page requests to the same host.
+    Not retried here, the download loops retry with their own policies.
+    """
+    breaker = circuit_breakers.breaker_for(url)
+    breaker.check()
+    with rate_limiter.limit(url):
+        try:
+            response = session.get(url, stream=True, timeout=timeout, **kwargs)
+        except Exception:
+            breaker.failure()
+            raise
+    with response:
+        if response.status_code in RETRY_STATUS:
+            breaker.failure()
+        else:
+            breaker.success()
+        yield response
+
+
+def fetch_html(url, timeout=page_timeout):
+    """
+    Download a html page through the shared session.
+
+    Parameters:
+        url (String): url of the page.
+
+    Returns:
+        html (String): decoded body of the page.
+    """
+    response = get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.text
+
+
+# ------------------------------------------------------- #
+#                   global variables
+# ------------------------------------------------------- #
+session = create_session()
@@ -0,0 +1,94 @@
+import threading
+
+from src.custom_logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class JobCancelled(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+
+class DownloadStalled(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+
+class JobControl:
+    """
+    Pause, cancel and stall flags of download jobs. The copy loops call checkpoint() once per chunk,
+    a paused job blocks there, a cancelled job raises JobCancelled and a stalled job raises
+    DownloadStalled out of its retry loops. Downloads that run inside ffmpeg only see the flags
+    between attempts.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.resumed = {}
+        self.cancelled = set()
+        self.stalled = set()
+
+    def pause(self, job_id):
+        with self.lock:
+            if job_id not in self.resumed:
+                self.resumed[job_id] = threading.Event()
+        logger.info(f"Paused {job_id}.")
+
+    def resume(self, job_id):
+        with self.lock:
+            event = self.resumed.pop(job_id, None)
+        if event:
+            event.set()
+            logger.info(f"Resumed {job_id}.")
+
+    def cancel(self, job_id):
+        with self.lock:
+            self.cancelled.add(job_id)
+            event = self.resumed.pop(job_id, None)
+        if event:
+            event.set()
+        logger.info(f"Cancelled {job_id}.")
+
+    def stall(self, job_id):
+        # Bleibt gesetzt, bis die Failover-Logik es löscht, damit alle Segment-Threads aufhören
+        self.stalled.add(job_id)
+
+    def clear_stall(self, job_id):
+        self.stalled.discard(job_id)
+
+    def is_paused(self, job_id):
+        return job_id in self.resumed
+
+    def is_cancelled(self, job_id):
+        return job_id in self.cancelled
+
+    def checkpoint(self, job_id):
+        # Schneller Pfad ohne Lock: die Mengen sind fast immer leer
+        if job_id in self.cancelled:
+            raise JobCancelled(f"{job_id} was cancelled")
+        if job_id in self.stalled:
+            raise DownloadStalled(f"{job_id} is too slow")
+        event = self.resumed.get(job_id)
+        if event is not None:
+            event.wait()
+            if job_id in self.cancelled:
+                raise JobCancelled(f"{job_id} was cancelled")
+
+    def forget(self, job_id):
+        with self.lock:
+            self.cancelled.discard(job_id)
+            self.stalled.discard(job_id)
+            event = self.resumed.pop(job_id, None)
+        if event:
+            event.set()
+
+
+# ------------------------------------------------------- #
+#                   global variables
+# ------------------------------------------------------- #
+job_control = JobControl()
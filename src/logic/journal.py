@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import threading
+import time
+
+from src.constants import journal_file
+from src.custom_logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                   definitions
+# ------------------------------------------------------- #
+PLANNED = "planned"
+RESOLVED = "resolved"
+DOWNLOADING = "downloading"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class JobJournal:
+    """
+    Write-ahead journal of download jobs. Every state change is committed before
+    the work it announces starts, so a crashed or killed run can be continued.
+
+    States: planned -> resolved -> downloading -> done, failed or cancelled.
+    Cancelled jobs are not picked up again by --resume.
+
+    Parameters:
+        db_path (String): location of the sqlite file.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def _connect(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.row_factory = sqlite3.Row
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=FULL")
+            with self.connection:
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS jobs ("
+                    "file_name TEXT PRIMARY KEY, link TEXT NOT NULL, season INTEGER, episode INTEGER, "
+                    "site_url TEXT NOT NULL, language TEXT NOT NULL, provider TEXT NOT NULL, "
+                    "state TEXT NOT NULL, cache_url TEXT, resolved_provider TEXT, updated_at REAL NOT NULL)"
+                )
+                self.connection.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)")
+        return self.connection
+
+    def _execute(self, statement, parameters):
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(statement, parameters)
+
+    def plan(self, job, site_url, language, provider):
+        self._execute(
+            "INSERT OR REPLACE INTO jobs (file_name, link, season, episode, site_url, language, provider, state, "
+            "cache_url, resolved_provider, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, NULL, ?)",
+            (job.file_name, job.link, job.season, job.episode, site_url, language, provider, PLANNED, time.time())
+        )
+
+    def resolved(self, file_name, cache_url, provider):
+        self._execute(
+            "UPDATE jobs SET state = ?, cache_url = ?, resolved_provider = ?, updated_at = ? WHERE file_name = ?",
+            (RESOLVED, cache_url, provider, time.time(), file_name)
+        )
+
+    def set_state(self, file_name, state):
+        self._execute("UPDATE jobs SET state = ?, updated_at = ? WHERE file_name = ?",
+                      (state, time.time(), file_name))
+
+    def unfinished(self):
+        with self.lock:
+            return self._connect().execute(
+                "SELECT * FROM jobs WHERE state NOT IN (?, ?) ORDER BY updated_at", (DONE, CANCELLED)
+            ).fetchall()
+
+    def prune_done(self):
+        self._execute("DELETE FROM jobs WHERE state IN (?, ?)", (DONE, CANCELLED))
+
+
+# ------------------------------------------------------- #
+#                   global variables
+# ------------------------------------------------------- #
+journal = JobJournal(journal_file)
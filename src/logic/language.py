@@ -82,54 +82,98 @@ def extract_lang_key_mapping(soup):
     return ret
 
 
-def get_href_by_language(html_content, language, provider):
-    soup = BeautifulSoup(html_content, "html.parser")
+def extract_provider_table(soup, providers):
+    """
+    Build the full {language: {provider: redirect_href}} table of an episode page in one pass.
+
+    Parameters:
+        soup (BeautifulSoup): parsed html page of the episode.
+        providers (List): provider names to collect alternative links for.
+
+    Returns:
+        links (Dict): {language: {provider: redirect_href}}.
+        fallback_links (Dict): {provider: href} of provider links found outside the language list.
+    """
     lang_key_mapping = extract_lang_key_mapping(soup)
 
-    if not lang_key_mapping:
-        # Versuche es mit dem Standard-Provider-Link
-        provider_elements = soup.find_all(["a", "div", "li"], string=lambda text: provider.lower() in str(text).lower())
-        if provider_elements:
-            for element in provider_elements:
-                href = element.get("data-link-target") or element.get("href")
-                if href:
-                    logger.warning(f"No language mapping found, using first available {provider} link")
-                    return href
-        raise LanguageError(logger.error("No language mapping or provider links found."))
-
-    # Debug logs
-    logger.debug(f"Language mapping: {lang_key_mapping}")
-    logger.debug(f"Given language: {language}")
-
-    # Find the data-lang-key value based on the input language
-    lang_key = lang_key_mapping.get(language)
-    if lang_key is None:
-        available_langs = list(lang_key_mapping.keys())
-        if available_langs:
-            logger.warning(f"Language '{language}' not found. Available languages: {available_langs}")
-            logger.warning(f"Using first available language: {available_langs[0]}")
-            lang_key = lang_key_mapping[available_langs[0]]
-        else:
-            raise LanguageError(logger.error("No languages available"))
-
-    # Find all <li> elements with the given data-lang-key value and h4=provider
-    matching_li_elements = soup.find_all("li", {"data-lang-key": lang_key})
-    matching_li_element = next((li_element for li_element in matching_li_elements
-                                if li_element.find("h4") and li_element.find("h4").get_text().lower() == provider.lower()), None)
-
-    # Wenn kein passendes Element gefunden wurde, suche nach alternativen Elementen
-    if not matching_li_element:
-        # Suche nach Links mit dem Provider-Namen
-        provider_elements = soup.find_all(["a", "div", "li"], string=lambda text: provider.lower() in str(text).lower())
-        for element in provider_elements:
-            href = element.get("data-link-target") or element.get("href")
+    hrefs_by_key = {}
+    for li_element in soup.find_all("li", attrs={"data-lang-key": True}):
+        h4_element = li_element.find("h4")
+        href = li_element.get("data-link-target", "")
+        if h4_element and href:
+            provider_hrefs = hrefs_by_key.setdefault(li_element.get("data-lang-key"), {})
+            provider_hrefs.setdefault(h4_element.get_text().strip().lower(), href)
+
+    links = {language: hrefs_by_key.get(lang_key, {}) for language, lang_key in lang_key_mapping.items()}
+
+    fallback_links = {}
+    for element in soup.find_all(["a", "div", "li"], string=True):
+        href = element.get("data-link-target") or element.get("href")
+        if not href:
+            continue
+        text = str(element.string).lower()
+        for provider in providers:
+            if provider.lower() in text:
+                fallback_links.setdefault(provider.lower(), href)
+
+    return links, fallback_links
+
+
+class ProviderTable:
+    """
+    Provider links of one episode page, resolved from a single parse.
+    Looking up another provider or language does not touch the network again.
+    """
+
+    def __init__(self, links, fallback_links):
+        self.links = links
+        self.fallback_links = fallback_links
+
+    @classmethod
+    def from_html(cls, html_content, providers):
+        soup = BeautifulSoup(html_content, "html.parser")
+        return cls(*extract_provider_table(soup, providers))
+
+    @classmethod
+    def from_dict(cls, table):
+        return cls(table["links"], table["fallback_links"])
+
+    def to_dict(self):
+        return {"links": self.links, "fallback_links": self.fallback_links}
+
+    @staticmethod
+    def has_links(table):
+        # Eine Seite ohne Links (Fehler oder geänderte Struktur) wird nicht gecacht
+        return any(table["links"].values()) or bool(table["fallback_links"])
+
+    def get_href(self, language, provider):
+        if not self.links:
+            # Versuche es mit dem Standard-Provider-Link
+            href = self.fallback_links.get(provider.lower())
             if href:
-                logger.warning(f"Using alternative {provider} link")
+                logger.warning(f"No language mapping found, using first available {provider} link")
                 return href
+            raise LanguageError(logger.error("No language mapping or provider links found."))
+
+        # Debug logs
+        logger.debug(f"Language mapping: {list(self.links.keys())}")
+        logger.debug(f"Given language: {language}")
+
+        provider_hrefs = self.links.get(language)
+        if provider_hrefs is None:
+            available_langs = list(self.links.keys())
+            logger.warning(f"Language '{language}' not found. Available languages: {available_langs}")
+            logger.warning(f"Using first available language: {available_langs[0]}")
+            provider_hrefs = self.links[available_langs[0]]
+
+        href = provider_hrefs.get(provider.lower())
+        if href:
+            return href
 
-    # Wenn ein passendes Element gefunden wurde, gib den Link zurück
-    if matching_li_element:
-        href = matching_li_element.get("data-link-target", "")
-        return href
+        # Wenn kein passendes Element gefunden wurde, suche nach alternativen Elementen
+        href = self.fallback_links.get(provider.lower())
+        if href:
+            logger.warning(f"Using alternative {provider} link")
+            return href
 
-    raise ProviderError(logger.error(f"No matching download found for language '{language}' and provider '{provider}'"))
+        raise ProviderError(logger.error(f"No matching download found for language '{language}' and provider '{provider}'"))
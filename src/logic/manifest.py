@@ -0,0 +1,192 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.constants import manifest_file, output_root
+from src.custom_logging import setup_logger
+from src.logic.ffmpeg import probe
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                   definitions
+# ------------------------------------------------------- #
+CHECKSUM_SAMPLE = 1024 * 1024
+MIN_DURATION_RATIO = 0.95
+
+# ------------------------------------------------------- #
+#                      functions
+# ------------------------------------------------------- #
+
+
+def quick_checksum(file_name, size):
+    # sha256 über Größe, ersten und letzten MiB - liest auch bei großen Dateien auf Netzlaufwerken nur 2 MiB
+    digest = hashlib.sha256(str(size).encode())
+    with open(file_name, "rb") as f:
+        digest.update(f.read(CHECKSUM_SAMPLE))
+        if size > CHECKSUM_SAMPLE:
+            f.seek(max(size - CHECKSUM_SAMPLE, CHECKSUM_SAMPLE))
+            digest.update(f.read(CHECKSUM_SAMPLE))
+    return digest.hexdigest()
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class CorruptDownload(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+
+class Manifest:
+    """
+    Index of completed downloads under the output root. Every finished episode is
+    recorded with size, duration, container and a quick checksum, so skip decisions
+    are one indexed query per directory instead of a stat per file.
+
+    Parameters:
+        db_path (String): location of the sqlite file.
+        root (String): output root the stored paths are relative to.
+    """
+
+    def __init__(self, db_path, root):
+        self.db_path = db_path
+        self.root = root
+        self.lock = threading.Lock()
+        self.connection = None
+        self.adopter = None
+        self.adopting = set()
+
+    def _connect(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.row_factory = sqlite3.Row
+            with self.connection:
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS downloads ("
+                    "path TEXT PRIMARY KEY, directory TEXT NOT NULL, size INTEGER NOT NULL, duration REAL, "
+                    "container TEXT, checksum TEXT NOT NULL, completed_at REAL NOT NULL)"
+                )
+                self.connection.execute("CREATE INDEX IF NOT EXISTS downloads_directory ON downloads (directory)")
+        return self.connection
+
+    def key(self, file_name):
+        return os.path.relpath(os.path.abspath(file_name), os.path.abspath(self.root)).replace(os.sep, "/")
+
+    def load_directory(self, directory):
+        """
+        All recorded downloads of one directory, e.g. a season folder.
+
+        Returns:
+            entries (Dict): {path: row} for an already_downloaded lookup without touching the disk.
+        """
+        directory_key = self.key(directory)
+        with self.lock:
+            rows = self._connect().execute(
+                "SELECT * FROM downloads WHERE directory = ?", (directory_key,)
+            ).fetchall()
+        # Eine Verzeichnisliste statt eines stat pro Datei, um gelöschte Dateien zu erkennen
+        try:
+            present = set(os.listdir(directory))
+        except FileNotFoundError:
+            present = set()
+        return {row["path"]: row for row in rows if row["path"].rpartition("/")[2] in present}
+
+    def lookup(self, file_name, entries=None):
+        if entries is not None:
+            return entries.get(self.key(file_name))
+        with self.lock:
+            return self._connect().execute(
+                "SELECT * FROM downloads WHERE path = ?", (self.key(file_name),)
+            ).fetchone()
+
+    def record(self, file_name, expected_duration=None):
+        """
+        Verify a finished download and add it to the manifest.
+
+        Parameters:
+            file_name (String): finished file.
+            expected_duration (Float): length the file must have, e.g. from the HLS playlist.
+
+        Raises:
+            CorruptDownload: the file is empty, unreadable or shorter than expected.
+        """
+        size = os.path.getsize(file_name)
+        if size == 0:
+            raise CorruptDownload(f"{file_name} is empty")
+        duration, container = None, None
+        probed = probe(file_name)
+        if probed is not None:
+            duration, container = probed
+            if duration is None:
+                raise CorruptDownload(f"{file_name} can not be read by ffprobe")
+            if expected_duration and duration < expected_duration * MIN_DURATION_RATIO:
+                raise CorruptDownload(f"{file_name} is truncated: {duration:.0f}s of {expected_duration:.0f}s")
+        checksum = quick_checksum(file_name, size)
+        key = self.key(file_name)
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO downloads (path, directory, size, duration, container, checksum, "
+                    "completed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, key.rpartition("/")[0], size, duration, container, checksum, time.time())
+                )
+        logger.debug(f"Recorded {file_name} in manifest ({size} bytes, {duration}s, {container}).")
+
+    def adopt(self, file_name):
+        """
+        Check a file that is on disk but not in the manifest, e.g. from an older version.
+
+        Returns:
+            True if the file is valid and now recorded, False if it is truncated or corrupt.
+        """
+        try:
+            self.record(file_name)
+            return True
+        except CorruptDownload as e:
+            logger.warning(f"{e}")
+            return False
+
+    def adopt_later(self, file_name):
+        """
+        adopt() a file on a background thread, so planning does not wait for ffprobe and the
+        checksum. A corrupt file is renamed to .corrupt, never deleted, and downloaded again
+        on the next run.
+        """
+        with self.lock:
+            if file_name in self.adopting:
+                return
+            self.adopting.add(file_name)
+            if self.adopter is None:
+                self.adopter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="manifest-adopt")
+        self.adopter.submit(self._adopt_in_background, file_name)
+
+    def _adopt_in_background(self, file_name):
+        try:
+            if not self.adopt(file_name):
+                corrupt_file = file_name + ".corrupt"
+                os.replace(file_name, corrupt_file)
+                logger.warning(f"Moved {file_name} to {corrupt_file}. It will be downloaded again on the next run.")
+        except OSError as e:
+            logger.warning(f"Could not check {file_name}: {e}")
+        finally:
+            with self.lock:
+                self.adopting.discard(file_name)
+
+    def forget(self, file_name):
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("DELETE FROM downloads WHERE path = ?", (self.key(file_name),))
+
+
+# ------------------------------------------------------- #
+#                   global variables
+# ------------------------------------------------------- #
+manifest = Manifest(manifest_file, output_root)
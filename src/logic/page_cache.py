@@ -0,0 +1,95 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from src.constants import cache_file, cache_ttl, disable_cache
+from src.custom_logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class PageCache:
+    """
+    SQLite cache for values scraped from the sites, keyed by url and page type.
+
+    Parameters:
+        db_path (String): location of the sqlite file.
+        ttls (Dict): {page_type: seconds} how long an entry of that page type stays valid.
+        enabled (Boolean): if False every lookup misses and nothing is stored.
+    """
+
+    def __init__(self, db_path, ttls, enabled=True):
+        self.db_path = db_path
+        self.ttls = ttls
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def _connect(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT NOT NULL, page_type TEXT NOT NULL, value TEXT NOT NULL, fetched_at REAL NOT NULL, "
+                "PRIMARY KEY (url, page_type))"
+            )
+            self.connection.commit()
+        return self.connection
+
+    def get(self, url, page_type):
+        if not self.enabled:
+            return None
+        with self.lock:
+            row = self._connect().execute(
+                "SELECT value, fetched_at FROM pages WHERE url = ? AND page_type = ?", (url, page_type)
+            ).fetchone()
+        if row is None:
+            return None
+        value, fetched_at = row
+        if time.time() - fetched_at > self.ttls.get(page_type, 0):
+            logger.debug(f"Cache entry {page_type} for {url} expired.")
+            return None
+        logger.debug(f"Cache hit {page_type} for {url}.")
+        return json.loads(value)
+
+    def set(self, url, page_type, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO pages (url, page_type, value, fetched_at) VALUES (?, ?, ?, ?)",
+                (url, page_type, json.dumps(value), time.time())
+            )
+            connection.commit()
+
+    def cached(self, url, page_type, compute, keep=bool):
+        """
+        Return the cached value or compute, store and return it.
+
+        Parameters:
+            url (String): url the value was scraped from.
+            page_type (String): kind of value, selects the ttl.
+            compute (Function): called without arguments on a cache miss.
+            keep (Function): decides whether a computed value is stored. By default empty
+                values (0 seasons, no providers) are not, a failed scrape is retried next time.
+        """
+        value = self.get(url, page_type)
+        if value is None:
+            value = compute()
+            if keep(value):
+                self.set(url, page_type, value)
+        return value
+
+
+# ------------------------------------------------------- #
+#                   global variables
+# ------------------------------------------------------- #
+page_cache = PageCache(cache_file, cache_ttl, enabled=not disable_cache)
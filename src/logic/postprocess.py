@@ -0,0 +1,162 @@
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from src.constants import (faststart, loudnorm, max_postprocess_workers, reencode_codec, reencode_crf,
+                           reencode_preset)
+from src.custom_logging import setup_logger
+from src.logic.disk_space import disk_space
+from src.logic.ffmpeg import probe, run_ffmpeg
+from src.logic.manifest import MIN_DURATION_RATIO, CorruptDownload, manifest
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                      functions
+# ------------------------------------------------------- #
+
+
+def postprocess_args(file_name, target, threads):
+    """
+    ffmpeg arguments for the enabled post-processing steps, None if nothing is enabled.
+    """
+    if not (faststart or reencode_codec or loudnorm):
+        return None
+    # Nur Video und Audio, Datenströme aus HLS (ID3) passen nicht in mp4
+    ffmpeg_args = ['-y', '-i', file_name, '-map', '0:v', '-map', '0:a?', '-threads', str(threads)]
+    if reencode_codec:
+        ffmpeg_args += ['-c:v', reencode_codec, '-crf', str(reencode_crf), '-preset', reencode_preset]
+        if reencode_codec in ("libx265", "hevc"):
+            # Ohne hvc1-Tag spielen Apple-Geräte HEVC in mp4 nicht ab
+            ffmpeg_args += ['-tag:v', 'hvc1']
+    else:
+        ffmpeg_args += ['-c:v', 'copy']
+    if loudnorm:
+        ffmpeg_args += ['-af', 'loudnorm=I=-16:TP=-1.5:LRA=11', '-c:a', 'aac', '-b:a', '192k']
+    else:
+        ffmpeg_args += ['-c:a', 'copy']
+    if faststart:
+        ffmpeg_args += ['-movflags', '+faststart']
+    return ffmpeg_args + [target]
+
+
+def postprocess_file_name(file_name):
+    root, extension = os.path.splitext(file_name)
+    return f"{root}.post{extension}"
+
+
+def postprocess(file_name, threads=1):
+    """
+    Run the enabled post-processing steps on a finished download. The result replaces
+    the download only if it is complete; on any error the download stays as it is.
+
+    Parameters:
+        file_name (String): finished and verified download.
+        threads (Integer): threads ffmpeg may use for encoding.
+
+    Returns:
+        True if the file was replaced by the processed version.
+    """
+    target = postprocess_file_name(file_name)
+    ffmpeg_args = postprocess_args(file_name, target, threads)
+    if ffmpeg_args is None:
+        return False
+    size_before = os.path.getsize(file_name)
+    probed = probe(file_name)
+    duration = probed[0] if probed else None
+    try:
+        # Die neue Datei liegt bis zum Ersetzen neben der alten
+        disk_space.reserve(target, size_before)
+        run_ffmpeg(ffmpeg_args, duration=duration)
+        if not os.path.exists(target) or os.path.getsize(target) == 0:
+            raise CorruptDownload(f"{target} is empty or missing")
+        processed = probe(target)
+        if duration and processed and (processed[0] or 0) < duration * MIN_DURATION_RATIO:
+            raise CorruptDownload(f"{target} is truncated: {processed[0]}s of {duration:.0f}s")
+        os.replace(target, file_name)
+    except (subprocess.CalledProcessError, CorruptDownload, OSError) as e:
+        logger.warning(f"Post-processing of {file_name} failed, keeping the download: {e}")
+        if os.path.exists(target):
+            os.remove(target)
+        return False
+    finally:
+        disk_space.release(target)
+    # Größe und Prüfsumme haben sich geändert
+    manifest.record(file_name, duration)
+    logger.info(f"Post-processed {file_name}: {size_before} -> {os.path.getsize(file_name)} bytes.")
+    return True
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class PostProcessor:
+    """
+    Post-processing stage behind the download scheduler. Every ffmpeg run is its own
+    process, so a small pool of worker threads keeps that many ffmpeg processes busy on
+    separate cores while the download workers go on with the next episodes.
+
+    All steps are optional. Without an enabled step there is no pool and submit() does nothing.
+
+    Parameters:
+        max_workers (Integer): ffmpeg jobs at the same time.
+    """
+
+    def __init__(self, max_workers=max_postprocess_workers):
+        self.max_workers = max_workers
+        # Kerne werden auf die gleichzeitigen ffmpeg-Prozesse aufgeteilt
+        self.threads = max(1, (os.cpu_count() or 1) // max_workers)
+        self.executor = (ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="postprocess")
+                         if self.enabled else None)
+        self.lock = threading.Lock()
+        self.pending = set()
+
+    @property
+    def enabled(self):
+        return bool(faststart or reencode_codec or loudnorm)
+
+    def submit(self, file_name):
+        if not self.enabled:
+            return None
+        future = self.executor.submit(self._run, file_name)
+        with self.lock:
+            self.pending.add(future)
+        future.add_done_callback(self._done)
+        logger.debug(f"{file_name} added to the post-processing queue.")
+        return future
+
+    def _run(self, file_name):
+        try:
+            return postprocess(file_name, self.threads)
+        except Exception as e:
+            logger.error(f"Post-processing of {file_name} failed: {e}")
+            return False
+
+    def _done(self, future):
+        with self.lock:
+            self.pending.discard(future)
+
+    def join(self):
+        # Wartet auch auf Aufträge, die während des Wartens hinzukommen
+        while True:
+            with self.lock:
+                pending = list(self.pending)
+            if not pending:
+                return
+            wait(pending)
+
+    def stats(self):
+        with self.lock:
+            return {"enabled": self.enabled, "pending": len(self.pending), "max_workers": self.max_workers}
+
+    def shutdown(self, wait_for_jobs=True):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait_for_jobs)
+
+
+# ------------------------------------------------------- #
+#                   global variables
+# ------------------------------------------------------- #
+post_processor = PostProcessor()
@@ -0,0 +1,147 @@
+import threading
+import time
+
+from src.constants import progress_interval
+from src.custom_logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class ProgressEvent:
+    """
+    Snapshot of one download job.
+
+    Parameters:
+        job_id (String): download job, usually its file name.
+        bytes_done (Integer): bytes written so far.
+        total (Integer): expected size in bytes, 0 if unknown.
+        speed (Float): bytes per second since the last event.
+        average_speed (Float): bytes per second since the job started.
+        eta (Float): seconds left, None if unknown.
+        finished (Boolean): last event of the job.
+        start_bytes (Integer): bytes already on disk when the job (re)started.
+    """
+
+    def __init__(self, job_id, bytes_done, total, speed, average_speed, eta, finished=False, start_bytes=0):
+        self.job_id = job_id
+        self.bytes_done = bytes_done
+        self.total = total
+        self.speed = speed
+        self.average_speed = average_speed
+        self.eta = eta
+        self.finished = finished
+        self.start_bytes = start_bytes
+
+    @property
+    def percent(self):
+        return (self.bytes_done / self.total) * 100 if self.total else None
+
+
+class ProgressBus:
+    """
+    Fan-out of progress events to any number of subscribers (CLI, GUI, log file).
+    """
+
+    def __init__(self):
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+    def subscribe(self, callback):
+        with self.lock:
+            self.subscribers = self.subscribers + [callback]
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            self.subscribers = [subscriber for subscriber in self.subscribers if subscriber != callback]
+
+    def publish(self, event):
+        for subscriber in self.subscribers:
+            try:
+                subscriber(event)
+            except Exception as e:
+                logger.warning(f"Progress subscriber failed: {e}")
+
+
+class ProgressReporter:
+    """
+    Counts the bytes of one job and publishes at most one event per interval.
+    update() only adds numbers unless an event is due, so it is cheap enough for the copy loop.
+
+    Parameters:
+        job_id (String): download job, usually its file name.
+        total (Integer): expected size in bytes, 0 if unknown.
+        bytes_done (Integer): bytes already on disk when the job (re)starts.
+    """
+
+    def __init__(self, job_id, total=0, bytes_done=0, bus=None, interval=progress_interval):
+        self.job_id = job_id
+        self.total = total
+        self.bytes_done = bytes_done
+        self.bus = bus or progress_bus
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.start_bytes = bytes_done
+        self.last_emit = self.started
+        self.last_bytes = bytes_done
+
+    def update(self, amount):
+        with self.lock:
+            self.bytes_done += amount
+            now = time.monotonic()
+            if now - self.last_emit < self.interval:
+                return
+            event = self._event(now)
+        self.bus.publish(event)
+
+    def set(self, bytes_done):
+        # Für Quellen, die absolute Werte liefern (z.B. ffmpeg total_size)
+        self.update(bytes_done - self.bytes_done)
+
+    def finish(self):
+        with self.lock:
+            event = self._event(time.monotonic(), finished=True)
+        self.bus.publish(event)
+
+    def _event(self, now, finished=False):
+        elapsed = now - self.last_emit
+        speed = (self.bytes_done - self.last_bytes) / elapsed if elapsed > 0 else 0.0
+        total_elapsed = now - self.started
+        average_speed = (self.bytes_done - self.start_bytes) / total_elapsed if total_elapsed > 0 else 0.0
+        eta = None
+        if self.total and average_speed > 0:
+            eta = max(self.total - self.bytes_done, 0) / average_speed
+        self.last_emit = now
+        self.last_bytes = self.bytes_done
+        return ProgressEvent(self.job_id, self.bytes_done, self.total, speed, average_speed, eta, finished,
+                             self.start_bytes)
+
+# ------------------------------------------------------- #
+#                      functions
+# ------------------------------------------------------- #
+
+
+def format_bytes(amount):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if amount < 1024:
+            return f"{amount:.1f} {unit}"
+        amount /= 1024
+    return f"{amount:.1f} TB"
+
+
+def log_progress(event):
+    percent = f"{event.percent:.1f}%" if event.percent is not None else format_bytes(event.bytes_done)
+    eta = f", ETA {int(event.eta)}s" if event.eta is not None else ""
+    logger.debug(f"Download progress {event.job_id}: {percent} at {format_bytes(event.speed)}/s "
+                 f"(avg {format_bytes(event.average_speed)}/s{eta})")
+
+
+# ------------------------------------------------------- #
+#                   global variables
+# ------------------------------------------------------- #
+progress_bus = ProgressBus()
+progress_bus.subscribe(log_progress)
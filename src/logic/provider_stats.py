@@ -0,0 +1,145 @@
+import os
+import sqlite3
+import threading
+import time
+
+from src.constants import provider_stats_file, provider_stats_half_life
+from src.custom_logging import setup_logger
+from src.logic.progress import progress_bus
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                   definitions
+# ------------------------------------------------------- #
+METRICS = ["resolve_latency", "resolve_success", "throughput", "download_success"]
+LATENCY_SCALE = 30.0  # in seconds of resolution latency that halve the score
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class ProviderStats:
+    """
+    Measured behaviour of every provider across runs: resolution latency, cache url success
+    rate, download throughput and download success rate. Every metric is a decayed average,
+    an observation loses half its weight every half_life seconds, so a provider that is
+    degraded this week drops in the ranking and recovers once it works again.
+
+    Parameters:
+        db_path (String): location of the sqlite file.
+        half_life (Float): seconds after which an observation counts half.
+    """
+
+    def __init__(self, db_path, half_life):
+        self.db_path = db_path
+        self.half_life = half_life
+        self.lock = threading.Lock()
+        self.connection = None
+        self.stats = None
+        self.speeds = {}
+
+    def _connect(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            with self.connection:
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS provider_stats ("
+                    "provider TEXT NOT NULL, metric TEXT NOT NULL, total REAL NOT NULL, weight REAL NOT NULL, "
+                    "updated_at REAL NOT NULL, PRIMARY KEY (provider, metric))"
+                )
+            # Wenige Zeilen, die Rangfolge wird pro Episode aus dem Speicher berechnet
+            self.stats = {}
+            for provider, metric, total, weight, updated_at in self.connection.execute(
+                    "SELECT provider, metric, total, weight, updated_at FROM provider_stats"):
+                self.stats[(provider, metric)] = [total, weight, updated_at]
+        return self.connection
+
+    def _decay(self, updated_at, now):
+        return 0.5 ** (max(now - updated_at, 0) / self.half_life)
+
+    def _observe(self, provider, metric, value):
+        now = time.time()
+        with self.lock:
+            connection = self._connect()
+            total, weight, updated_at = self.stats.get((provider, metric), [0.0, 0.0, now])
+            decay = self._decay(updated_at, now)
+            entry = [total * decay + value, weight * decay + 1, now]
+            self.stats[(provider, metric)] = entry
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO provider_stats (provider, metric, total, weight, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)", (provider, metric, *entry)
+                )
+
+    def record_resolve(self, provider, latency, succeeded):
+        self._observe(provider, "resolve_latency", latency)
+        self._observe(provider, "resolve_success", 1.0 if succeeded else 0.0)
+
+    def record_download(self, provider, succeeded, throughput=None):
+        if throughput:
+            self._observe(provider, "throughput", throughput)
+        self._observe(provider, "download_success", 1.0 if succeeded else 0.0)
+
+    def on_progress(self, event):
+        # Letzte mittlere Geschwindigkeit je Job, abgeholt von pop_speed() wenn der Download endet
+        if event.average_speed:
+            self.speeds[event.job_id] = event.average_speed
+
+    def pop_speed(self, job_id):
+        return self.speeds.pop(job_id, None)
+
+    def summary(self, provider):
+        """
+        Returns:
+            summary (Dict): {metric: (average, weight)} of the metrics observed for the provider.
+        """
+        now = time.time()
+        with self.lock:
+            self._connect()
+            summary = {}
+            for metric in METRICS:
+                entry = self.stats.get((provider, metric))
+                if entry and entry[1]:
+                    total, weight, updated_at = entry
+                    summary[metric] = (total / weight, weight * self._decay(updated_at, now))
+            return summary
+
+    def rank(self, providers):
+        """
+        Order providers by expected usable throughput: success rates times throughput,
+        lowered by slow resolution. Success rates start from one optimistic observation and
+        a provider without throughput data gets the best measured one, so new providers are
+        tried. Ties keep the given order, which puts the user's choice first.
+
+        Returns:
+            providers (List): the same providers, best first.
+        """
+        summaries = {provider: self.summary(provider) for provider in providers}
+        known = [summary["throughput"][0] for summary in summaries.values() if "throughput" in summary]
+        best_throughput = max(known) if known else 1.0
+
+        def success_rate(summary, metric):
+            average, weight = summary.get(metric, (0.0, 0.0))
+            return (average * weight + 1) / (weight + 1)
+
+        def score(provider):
+            summary = summaries[provider]
+            throughput = summary["throughput"][0] if "throughput" in summary else best_throughput
+            latency = summary["resolve_latency"][0] if "resolve_latency" in summary else 0.0
+            return (success_rate(summary, "resolve_success") * success_rate(summary, "download_success")
+                    * throughput / (1 + latency / LATENCY_SCALE))
+
+        ranked = sorted(providers, key=score, reverse=True)
+        if ranked != list(providers):
+            logger.debug(f"Provider order {list(providers)} ranked as {ranked}.")
+        return ranked
+
+
+# ------------------------------------------------------- #
+#                   global variables
+# ------------------------------------------------------- #
+provider_stats = ProviderStats(provider_stats_file, provider_stats_half_life)
+progress_bus.subscribe(provider_stats.on_progress)
@@ -0,0 +1,99 @@
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from src.constants import default_rate_limit, host_rate_limits
+from src.custom_logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class TokenBucket:
+    """
+    Token bucket with an upper bound of connections in flight.
+
+    Parameters:
+        rate (Float): tokens refilled per second.
+        burst (Integer): maximum number of tokens the bucket holds.
+        max_in_flight (Integer): maximum number of requests running at the same time.
+    """
+
+    def __init__(self, rate, burst, max_in_flight=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+
+    def take(self, amount=1):
+        # Bigger requests than the bucket can hold are allowed once it is full and leave it in debt.
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= min(amount, self.burst):
+                    self.tokens -= amount
+                    return
+                wait_time = (min(amount, self.burst) - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+    @contextmanager
+    def limit(self):
+        if self.in_flight:
+            self.in_flight.acquire()
+        try:
+            self.take()
+            yield
+        finally:
+            if self.in_flight:
+                self.in_flight.release()
+
+
+class RateLimiter:
+    """
+    Shared rate limiter with one TokenBucket per host.
+
+    Parameters:
+        limits (Dict): {host: {"rate": Float, "burst": Integer, "max_in_flight": Integer}}.
+            A host matches if it is equal to the key, a subdomain of it, or - for keys
+            without a dot like "voe" - contains the key.
+        default (Dict): limits for every host not listed in limits.
+    """
+
+    def __init__(self, limits, default):
+        self.limits = limits
+        self.default = default
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def _key_for(self, host):
+        for key in self.limits:
+            if host == key or host.endswith("." + key) or ("." not in key and key in host):
+                return key
+        return host
+
+    def bucket_for(self, url):
+        host = (urlparse(url).hostname or "").lower()
+        key = self._key_for(host)
+        with self.lock:
+            if key not in self.buckets:
+                settings = self.limits.get(key, self.default)
+                logger.debug(f"New rate limit bucket for {key}: {settings}")
+                self.buckets[key] = TokenBucket(settings["rate"], settings["burst"], settings.get("max_in_flight"))
+            return self.buckets[key]
+
+    def limit(self, url):
+        return self.bucket_for(url).limit()
+
+
+# ------------------------------------------------------- #
+#                   global variables
+# ------------------------------------------------------- #
+rate_limiter = RateLimiter(host_rate_limits, default_rate_limit)
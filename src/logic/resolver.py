@@ -0,0 +1,225 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from functools import partial
+
+from requests import RequestException
+
+from src.constants import hedge_delay, hedged_resolution, max_resolve_threads
+from src.custom_logging import setup_logger
+from src.logic import http_client
+from src.logic.journal import FAILED, journal
+from src.logic.language import LanguageError, ProviderError
+from src.logic.provider_stats import provider_stats
+from src.logic.search_for_links import (find_cache_url, get_provider_table, get_redirect_link,
+                                        get_redirect_link_by_provider, provider_order)
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                      functions
+# ------------------------------------------------------- #
+
+
+def resolve_episode(job, site_url, language, provider):
+    """
+    Resolve the cache url of one episode.
+
+    Returns:
+        (cache_url, provider) or None if the episode can not be downloaded.
+    """
+    if hedged_resolution:
+        try:
+            result = resolve_hedged(job, site_url, language, provider)
+        except LanguageError:
+            result = None
+        if result is None:
+            logger.error(f"Could not find cache url for {job.season}, {job.episode} with any provider.")
+            journal.set_state(job.file_name, FAILED)
+            return None
+        cache_url, provider = result
+        logger.debug("{} Cache URL is: ".format(provider) + cache_url)
+        journal.resolved(job.file_name, cache_url, provider)
+        return cache_url, provider
+    try:
+        redirect_link, provider = get_redirect_link_by_provider(site_url, job.link, language, provider)
+    except (LanguageError, ProviderError):
+        journal.set_state(job.file_name, FAILED)
+        return None
+    cache_url = timed_find_cache_url(redirect_link, provider)
+    if cache_url == 0:
+        logger.error(f"Could not find cache url for {provider} on {job.season}, {job.episode}.")
+        # Nächster Provider in der gemessenen Reihenfolge
+        result = resolve_failover(job, site_url, language, [provider])
+        if result is None:
+            journal.set_state(job.file_name, FAILED)
+            return None
+        cache_url, provider = result
+    logger.debug("{} Cache URL is: ".format(provider) + cache_url)
+    journal.resolved(job.file_name, cache_url, provider)
+    return cache_url, provider
+
+
+def resolve_hedged(job, site_url, language, provider, delay=hedge_delay):
+    """
+    Resolve the cache url through several providers at once. The best ranked provider
+    starts first; whenever a lookup fails or delay seconds pass without a result, the next
+    provider of the episode starts in parallel. The first valid cache url wins, providers
+    that have not started are dropped and running lookups finish in the background.
+
+    Parameters:
+        job (EpisodeJob): episode to resolve.
+        site_url (String): serie or anime site.
+        language (String): desired language to download the video file in.
+        provider (String): chosen provider, see provider_order().
+        delay (Float): seconds before the next provider is started.
+
+    Returns:
+        (cache_url, provider) or None if no provider delivers a cache url.
+
+    Raises:
+        LanguageError: the episode is not available in the language.
+    """
+    provider_table = get_provider_table(job.link)
+    candidates = []
+    for candidate in provider_order(provider):
+        try:
+            candidates.append(get_redirect_link(site_url, provider_table, language, candidate))
+        except ProviderError:
+            continue
+
+    executor = ThreadPoolExecutor(max_workers=max(len(candidates), 1), thread_name_prefix="hedge")
+    futures = {}
+    pending = set()
+    try:
+        while True:
+            if len(futures) < len(candidates):
+                redirect_link, candidate = candidates[len(futures)]
+                if futures:
+                    logger.debug(f"Hedging {job.file_name} with {candidate}.")
+                future = executor.submit(timed_find_cache_url, redirect_link, candidate)
+                futures[future] = candidate
+                pending.add(future)
+            if not pending:
+                return None
+            timeout = delay if len(futures) < len(candidates) else None
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    cache_url = future.result()
+                except Exception as e:
+                    logger.warning(f"Cache url lookup of {futures[future]} failed: {e}")
+                    cache_url = 0
+                if cache_url != 0:
+                    return cache_url, futures[future]
+    finally:
+        # Laufende Anfragen lassen sich nicht abbrechen, ihr Ergebnis wird verworfen
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def timed_find_cache_url(redirect_link, provider):
+    """
+    find_cache_url() that records latency and outcome in the provider stats.
+    """
+    started = time.monotonic()
+    cache_url = find_cache_url(redirect_link, provider)
+    provider_stats.record_resolve(provider, time.monotonic() - started, cache_url != 0)
+    return cache_url
+
+
+def resolve_failover(job, site_url, language, tried):
+    """
+    Resolve the episode through the best ranked provider not tried yet,
+    e.g. when the download from the current provider stalls.
+
+    Parameters:
+        job (EpisodeJob): episode to resolve.
+        site_url (String): serie or anime site.
+        language (String): desired language to download the video file in.
+        tried (List): providers that must not be used again.
+
+    Returns:
+        (cache_url, provider) or None if no other provider offers the episode.
+    """
+    provider_table = get_provider_table(job.link)
+    for provider in provider_order():
+        if provider in tried:
+            continue
+        try:
+            redirect_link, provider = get_redirect_link(site_url, provider_table, language, provider)
+        except (LanguageError, ProviderError):
+            continue
+        cache_url = timed_find_cache_url(redirect_link, provider)
+        if cache_url != 0:
+            return cache_url, provider
+    return None
+
+
+def failover_for(job, site_url, language):
+    """
+    Failover callback for DownloadScheduler.submit().
+    """
+    return partial(resolve_failover, job, site_url, language)
+
+
+def cache_url_alive(cache_url):
+    """
+    Check if an earlier resolved cache url can still be downloaded.
+    """
+    try:
+        return http_client.head(cache_url, timeout=10).status_code == 200
+    except RequestException:
+        return False
+
+
+def resolve_all(requests, max_workers=max_resolve_threads):
+    """
+    Resolve episodes of any number of shows on one bounded worker pool.
+
+    Parameters:
+        requests (List): (job, site_url, language, provider) tuples, each with the settings of its show.
+        max_workers (Integer): number of episodes resolved at the same time.
+
+    Yields:
+        (job, cache_url, provider) in the order the resolutions complete.
+    """
+    if not requests:
+        return
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="resolver") as executor:
+        futures = {executor.submit(resolve_episode, job, site_url, language, provider): job
+                   for job, site_url, language, provider in requests}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Could not resolve {job.file_name}: {e}")
+                journal.set_state(job.file_name, FAILED)
+                continue
+            if result is not None:
+                yield job, result[0], result[1]
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class EpisodeJob:
+    """
+    One planned episode or movie: where it comes from and where it goes.
+
+    Parameters:
+        file_name (String): target file of the download.
+        link (String): link of the html page of the episode.
+        season (Integer): season of the episode, 0 for movies.
+        episode (Integer): episode or movie number.
+    """
+
+    def __init__(self, file_name, link, season, episode):
+        self.file_name = file_name
+        self.link = link
+        self.season = season
+        self.episode = episode
+
+    def __repr__(self):
+        return f"EpisodeJob({self.file_name!r})"
+
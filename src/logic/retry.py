@@ -0,0 +1,197 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+
+from src.constants import circuit_breaker_settings, max_retry_after, retry_policies
+from src.custom_logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                   definitions
+# ------------------------------------------------------- #
+RETRY_STATUS = {429, 500, 502, 503, 504, 520, 521, 522, 523, 524}
+
+# ------------------------------------------------------- #
+#                      functions
+# ------------------------------------------------------- #
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header: seconds or an HTTP date.
+
+    Returns:
+        seconds (Float): time to wait, capped at max_retry_after. None if missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), max_retry_after)
+
+
+def retry_after_of(error):
+    """
+    Wait time an error asks for: Retry-After of an HTTP response or the rest of an open circuit.
+    """
+    if isinstance(error, CircuitOpen):
+        return error.remaining
+    response = getattr(error, "response", None)
+    if response is not None:
+        return parse_retry_after(response.headers.get("Retry-After"))
+    return None
+
+
+def retry_call(function, policy, retry_on=(Exception,), description="call"):
+    """
+    Call function until it succeeds or the attempt budget of the policy is used up.
+
+    Parameters:
+        function (Function): called without arguments.
+        policy (RetryPolicy): attempt budget and backoff.
+        retry_on (Tuple): exception types worth another attempt, all others are raised at once.
+        description (String): what is retried, for the log.
+
+    Raises:
+        the last exception once the budget is used up.
+    """
+    for attempt in range(1, policy.attempts + 1):
+        try:
+            return function()
+        except retry_on as e:
+            if attempt == policy.attempts:
+                raise
+            wait_time = policy.delay(attempt, retry_after_of(e))
+            logger.debug(f"{description} attempt {attempt}/{policy.attempts} failed: {e}. "
+                         f"Retrying in {wait_time:.1f}s.")
+            time.sleep(wait_time)
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class CircuitOpen(requests.RequestException):
+    def __init__(self, host, remaining):
+        super().__init__(f"Circuit for {host} is open, retry in {remaining:.0f}s")
+        self.host = host
+        self.remaining = remaining
+
+
+class RetryPolicy:
+    """
+    Attempt budget with jittered exponential backoff.
+
+    Parameters:
+        attempts (Integer): calls in total, including the first one.
+        base_delay (Float): seconds before the second attempt, doubled for every further one.
+        max_delay (Float): upper bound of the backoff.
+    """
+
+    def __init__(self, attempts, base_delay, max_delay):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Seconds to wait after the given failed attempt. A Retry-After of the server is honoured
+        even if it is longer than the backoff.
+        """
+        backoff = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        # Jitter in der oberen Hälfte, damit parallele Jobs nicht im Gleichschritt wiederkommen
+        backoff = random.uniform(backoff / 2, backoff)
+        if retry_after is not None:
+            return max(retry_after, backoff)
+        return backoff
+
+
+class CircuitBreaker:
+    """
+    Fails calls to a host fast after failure_threshold failures in a row. After reset_timeout
+    one trial call is let through; its success closes the circuit, its failure opens it again.
+
+    Parameters:
+        host (String): host the circuit belongs to.
+        failure_threshold (Integer): failures in a row that open the circuit.
+        reset_timeout (Float): seconds the circuit stays open.
+    """
+
+    def __init__(self, host, failure_threshold, reset_timeout):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def check(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining <= 0 and not self.trial_running:
+                self.trial_running = True
+                logger.info(f"Trying {self.host} again.")
+                return
+            raise CircuitOpen(self.host, max(remaining, 1.0))
+
+    def success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                logger.info(f"{self.host} is back. Closing its circuit.")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or (self.opened_at is None and self.failures >= self.failure_threshold):
+                logger.warning(f"{self.host} failed {self.failures} times in a row. "
+                               f"Failing requests fast for {self.reset_timeout}s.")
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+class CircuitBreakers:
+    """
+    One CircuitBreaker per host.
+
+    Parameters:
+        settings (Dict): {"failure_threshold": Integer, "reset_timeout": Float}.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def breaker_for(self, url):
+        host = (urlparse(url).hostname or "").lower()
+        with self.lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(host, self.settings["failure_threshold"],
+                                                     self.settings["reset_timeout"])
+            return self.breakers[host]
+
+
+# ------------------------------------------------------- #
+#                   global variables
+# ------------------------------------------------------- #
+http_retry = RetryPolicy(**retry_policies["http"])
+cache_url_retry = RetryPolicy(**retry_policies["cache_url"])
+download_retry = RetryPolicy(**retry_policies["download"])
+segment_retry = RetryPolicy(**retry_policies["segment"])
+circuit_breakers = CircuitBreakers(circuit_breaker_settings)
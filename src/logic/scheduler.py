@@ -0,0 +1,173 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from requests import RequestException
+
+from src.constants import max_download_threads
+from src.custom_logging import setup_logger
+from src.logic.downloader import start_download
+from src.logic.job_control import DownloadStalled, job_control
+from src.logic.journal import CANCELLED, DONE, DOWNLOADING, FAILED, journal
+from src.logic.postprocess import post_processor
+from src.logic.provider_stats import provider_stats
+from src.logic.watchdog import stall_watchdog
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class DownloadScheduler:
+    """
+    Fixed pool of download workers fed by a job queue. A finished download hands
+    its worker to the next queued job immediately.
+
+    Parameters:
+        max_workers (Integer): number of downloads running at the same time.
+    """
+
+    def __init__(self, max_workers=max_download_threads):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="download")
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.futures = {}
+
+    def _run(self, url, file_name, provider, failover):
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+        journal.set_state(file_name, DOWNLOADING)
+        succeeded = False
+        try:
+            succeeded = self._download(url, file_name, provider, failover)
+            if succeeded:
+                # Die Nachbearbeitung läuft getrennt, der Worker nimmt sofort den nächsten Download
+                post_processor.submit(file_name)
+            return succeeded
+        finally:
+            if job_control.is_cancelled(file_name):
+                journal.set_state(file_name, CANCELLED)
+            else:
+                journal.set_state(file_name, DONE if succeeded else FAILED)
+            job_control.forget(file_name)
+            with self.lock:
+                self.running -= 1
+                self.futures.pop(file_name, None)
+
+    def _download(self, url, file_name, provider, failover):
+        tried = [provider]
+        while True:
+            if failover:
+                stall_watchdog.watch(file_name)
+            try:
+                succeeded = start_download(url, file_name, provider)
+                if not job_control.is_cancelled(file_name):
+                    provider_stats.record_download(provider, succeeded, provider_stats.pop_speed(file_name))
+                return succeeded
+            except DownloadStalled:
+                provider_stats.record_download(provider, False, provider_stats.pop_speed(file_name))
+                job_control.clear_stall(file_name)
+                try:
+                    result = failover(tried)
+                except RequestException as e:
+                    # Seite nicht erreichbar (auch CircuitOpen): beim bisherigen Provider bleiben
+                    logger.warning(f"Failover for {file_name} failed: {e}")
+                    result = None
+                if result is None:
+                    logger.warning(f"No other provider for {file_name}. Continuing with {provider}.")
+                    failover = None
+                    continue
+                url, provider = result
+                tried.append(provider)
+                journal.resolved(file_name, url, provider)
+                # Liefert der neue Provider dieselbe Datei, setzt der Download an der gleichen Stelle fort
+                logger.info(f"Switching {file_name} to {provider}.")
+            finally:
+                stall_watchdog.unwatch(file_name)
+
+    def submit(self, url, file_name, provider, failover=None):
+        """
+        Queue a download.
+
+        Parameters:
+            failover (Function): called with the providers tried so far when the download stalls,
+                returns (cache_url, provider) of another provider or None. None disables the watchdog.
+
+        Returns:
+            future (Future): resolves to True if the download succeeded. For a file that is
+                already queued or running, the future of that job.
+        """
+        with self.lock:
+            # Zwei Worker auf derselben .part-Datei würden sich gegenseitig überschreiben
+            if file_name in self.futures:
+                logger.debug(f"{file_name} is already queued or running.")
+                return self.futures[file_name]
+            self.queued += 1
+            future = self.executor.submit(self._run, url, file_name, provider, failover)
+            self.futures[file_name] = future
+        logger.loading("Provider {} - File {} added to queue.".format(provider, file_name))
+        return future
+
+    def cancel(self, file_name):
+        """
+        Cancel a queued or running download. A queued job never starts, a running one
+        stops at its next chunk and keeps its partial data.
+
+        Returns:
+            cancelled (Boolean): False if the job is unknown or already finished.
+        """
+        with self.lock:
+            future = self.futures.get(file_name)
+            if future is None:
+                return False
+            if future.cancel():
+                self.queued -= 1
+                self.futures.pop(file_name, None)
+                journal.set_state(file_name, CANCELLED)
+                logger.info(f"Removed {file_name} from the queue.")
+                return True
+        job_control.cancel(file_name)
+        return True
+
+    def pause(self, file_name):
+        job_control.pause(file_name)
+
+    def resume(self, file_name):
+        job_control.resume(file_name)
+
+    def stats(self):
+        with self.lock:
+            return {"queued": self.queued, "running": self.running, "max_workers": self.max_workers}
+
+    def wait(self, futures):
+        """
+        Wait for the given downloads. A job that raised counts as failed, so the results
+        of all other jobs are still returned.
+
+        Returns:
+            results (List): True or False per download.
+        """
+        done, _ = wait(futures)
+        results = []
+        for future in done:
+            if future.cancelled():
+                results.append(False)
+            elif future.exception() is not None:
+                logger.error(f"Download job failed: {future.exception()}")
+                results.append(False)
+            else:
+                results.append(future.result())
+        return results
+
+    def shutdown(self, wait_for_jobs=True):
+        self.executor.shutdown(wait=wait_for_jobs)
+
+
+# ------------------------------------------------------- #
+#                   global variables
+# ------------------------------------------------------- #
+download_scheduler = DownloadScheduler()
@@ -1,20 +1,22 @@
 import base64
 import re
-import urllib.request
-from urllib.error import URLError
-
 from bs4 import BeautifulSoup
+from requests import RequestException
 
 from src.custom_logging import setup_logger
-from src.logic.language import ProviderError, get_href_by_language
-from src.constants import (provider_priority)
+from src.logic.language import ProviderError, ProviderTable
+from src.logic.http_client import fetch_html
+from src.logic.page_cache import page_cache
+from src.logic.provider_stats import provider_stats
+from src.logic.retry import cache_url_retry, retry_call
+from src.constants import adaptive_provider_order, provider_priority
 
 logger = setup_logger(__name__)
 
 # ------------------------------------------------------- #
 #                   definitions
 # ------------------------------------------------------- #
-cache_url_attempts = 0
+MAX_REDIRECTS = 3
 
 # ------------------------------------------------------- #
 #                   global variables
@@ -36,12 +38,29 @@ def get_year(url):
     Parameters:
         url (String): url of the show.
 
+    Returns:
+        year (String): year of the show.
+    """
+    year = page_cache.get(url, "year")
+    if year is None:
+        soup = BeautifulSoup(fetch_html(url), features="html.parser")
+        year = parse_year(soup)
+        if year:
+            page_cache.set(url, "year", year)
+    return year
+
+
+def parse_year(soup):
+    """
+    Get the year of the show from an already parsed show page.
+
+    Parameters:
+        soup (BeautifulSoup): parsed html page of the show.
+
     Returns:
         year (String): year of the show.
     """
     try:
-        html_page = urllib.request.urlopen(url)
-        soup = BeautifulSoup(html_page, features="html.parser")
         year = soup.find("span", {"itemprop": "startDate"}).text
         return year
     except AttributeError:
@@ -52,10 +71,10 @@ def get_year(url):
 def get_redirect_link_by_provider(site_url, internal_link, language, provider):
     """
     Sets the priority in which downloads are attempted.
-    First -> VOE download, if not available...
-    Second -> Streamtape download, if not available...
-    Third -> Vidoza download
-    Fourth -> SpeedFiles download
+    First -> the chosen provider, if not available...
+    then the others of provider_priority.
+    With adaptive_provider_order the measured provider stats decide the order,
+    the chosen provider only wins ties.
 
     Parameters:
         site_url (String): serie or anime site.
@@ -66,89 +85,148 @@ def get_redirect_link_by_provider(site_url, internal_link, language, provider):
     Returns:
         get_redirect_link(): returns link_to_redirect and provider.
     """
-    local_provider_priority = provider_priority.copy()
-    local_provider_priority.remove(provider)
-    try:
-        return get_redirect_link(site_url, internal_link, language, provider)
-    except ProviderError:
-        logger.info(f"Provider {provider} failed. Trying {local_provider_priority[0]} next.")
+    local_provider_priority = provider_order(provider)
+    provider_table = get_provider_table(internal_link)
+    for index, local_provider in enumerate(local_provider_priority):
         try:
-            return get_redirect_link(site_url, internal_link, language, local_provider_priority[0])
+            return get_redirect_link(site_url, provider_table, language, local_provider)
         except ProviderError:
-            logger.info(f"Provider {local_provider_priority[0]} failed. Trying {local_provider_priority[1]} next.")
-            return get_redirect_link(site_url, internal_link, language, local_provider_priority[1])
+            if index == len(local_provider_priority) - 1:
+                raise
+            logger.info(f"Provider {local_provider} failed. Trying {local_provider_priority[index + 1]} next.")
+
+
+def provider_order(provider=None):
+    """
+    Providers in the order they are tried for one episode.
+
+    Parameters:
+        provider (String): chosen provider, first unless the measured stats rank another one higher.
+    """
+    local_provider_priority = provider_priority.copy()
+    if provider in local_provider_priority:
+        local_provider_priority.remove(provider)
+        local_provider_priority.insert(0, provider)
+    if adaptive_provider_order:
+        return provider_stats.rank(local_provider_priority)
+    return local_provider_priority
+
+
+def get_provider_table(html_link):
+    """
+    Download and parse the episode page once, or take its table from the page cache.
+
+    Parameters:
+        html_link (String): link of the html page of the episode.
+
+    Returns:
+        provider_table (ProviderTable): all provider links of the episode by language.
+    """
+    table = page_cache.cached(html_link, "providers",
+                              lambda: ProviderTable.from_html(fetch_html(html_link), provider_priority).to_dict(),
+                              keep=ProviderTable.has_links)
+    return ProviderTable.from_dict(table)
 
 
-def get_redirect_link(site_url, html_link, language, provider):
-    html_response = urllib.request.urlopen(html_link)
-    href_value = get_href_by_language(html_response, language, provider)
+def get_redirect_link(site_url, provider_table, language, provider):
+    href_value = provider_table.get_href(language, provider)
     link_to_redirect = site_url + href_value
     logger.debug("Link to redirect is: " + link_to_redirect)
     return link_to_redirect, provider
      
 
 def find_cache_url(url, provider):
-    global cache_url_attempts
+    """
+    Find the direct video link on the page of a provider.
+
+    Parameters:
+        url (String): page of the provider, the redirect link of the episode.
+        provider (String): provider of the page.
+
+    Returns:
+        cache_link (String): direct video or HLS link, 0 if none was found.
+    """
     logger.debug("Enterd {} to cache".format(provider))
     try:
-        html_page = urllib.request.urlopen(url)
-    except URLError as e:
-        logger.warning(f"{e}")
-        logger.info("Trying again to read HTML Element...")
-        if cache_url_attempts < 5:
-            return find_cache_url(url, provider)
-        else:
-            logger.error("Could not find cache url HTML for {}.".format(provider))
-            return 0
-    try:
-        if provider == "Vidoza":
-            soup = BeautifulSoup(html_page, features="html.parser")
-            cache_link = soup.find("source").get("src")
-        elif provider == "SpeedFiles":
-            cache_link = re.search(r'src="([^"]+)"', html_page.read().decode('utf-8')).group(1)
-            logger.debug(f"Link: {cache_link}")
-            if "store_access" in cache_link:
-                logger.info("Found SpeedFiles mp4 Link!")
-                return cache_link
-        elif provider == "VOE":
-            html_page = html_page.read().decode('utf-8')
-            for VOE_PATTERN in VOE_PATTERNS:
-                match = VOE_PATTERN.search(html_page)
-                if match:
-                    if match.group(0).startswith("window.location.href"):
-                        logger.info("Found window.location.href. Redirecting...")
-                        logger.debug(f"Redirecting to {match.group(1)}")
-                        return find_cache_url(match.group(1), provider)
-                    cache_link = match.group(1)
-                    cache_link = base64.b64decode(cache_link).decode('utf-8')
-                    if cache_link and cache_link.startswith("https://"):
-                        return cache_link
-            logger.error("Could not find cache url for {}.".format(provider))
-            return 0
-        elif provider == "Streamtape":
-            cache_link = STREAMTAPE_PATTERN.search(html_page.read().decode('utf-8'))
-            if cache_link is None:
-                return find_cache_url(url, provider)
-            cache_link = "https://" + provider + ".com/" + cache_link.group()[:-1]
-            logger.debug(f"This is the found video link of {provider}: {cache_link}")
-    except AttributeError as e:
+        # Seiten ohne Link (z.B. Streamtape ohne Token) werden nach Policy neu geladen
+        cache_link = retry_call(lambda: extract_cache_url(url, provider), cache_url_retry,
+                                retry_on=(CacheUrlMissing,), description=f"{provider} cache url")
+    except CacheUrlMissing as e:
         logger.error(f"ERROR: {e}")
-        logger.info("Trying again...")
-        if cache_url_attempts < 5:
-            cache_url_attempts += 1
-            return find_cache_url(url, provider)
-        else:
-            logger.error("Could not find cache url for {}.".format(provider))
-            return 0
-        
+        logger.error("Could not find cache url for {}.".format(provider))
+        return 0
+    except RequestException as e:
+        logger.warning(f"{e}")
+        logger.error("Could not find cache url HTML for {}.".format(provider))
+        return 0
     logger.debug("Exiting {} to Cache".format(provider))
     return cache_link
 
+
+def extract_cache_url(url, provider):
+    """
+    One attempt of find_cache_url(): download the provider page and read the link from it.
+    VOE redirects are followed within the attempt, so a lookup has one budget in total.
+
+    Raises:
+        CacheUrlMissing: the page has no link, another attempt may have one.
+        RequestException: the page could not be downloaded, already retried by http_client.
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        html_page = fetch_html(url)
+        cache_link = 0
+        try:
+            if provider == "Vidoza":
+                soup = BeautifulSoup(html_page, features="html.parser")
+                cache_link = soup.find("source").get("src")
+            elif provider == "SpeedFiles":
+                cache_link = re.search(r'src="([^"]+)"', html_page).group(1)
+                logger.debug(f"Link: {cache_link}")
+                if "store_access" in cache_link:
+                    logger.info("Found SpeedFiles mp4 Link!")
+                    return cache_link
+            elif provider == "VOE":
+                redirect = None
+                for VOE_PATTERN in VOE_PATTERNS:
+                    match = VOE_PATTERN.search(html_page)
+                    if match:
+                        if match.group(0).startswith("window.location.href"):
+                            redirect = match.group(1)
+                            break
+                        cache_link = match.group(1)
+                        cache_link = base64.b64decode(cache_link).decode('utf-8')
+                        if cache_link and cache_link.startswith("https://"):
+                            return cache_link
+                if redirect:
+                    logger.info("Found window.location.href. Redirecting...")
+                    logger.debug(f"Redirecting to {redirect}")
+                    url = redirect
+                    continue
+                logger.error("Could not find cache url for {}.".format(provider))
+                return 0
+            elif provider == "Streamtape":
+                cache_link = STREAMTAPE_PATTERN.search(html_page)
+                if cache_link is None:
+                    raise CacheUrlMissing(f"No Streamtape video link on {url}")
+                cache_link = "https://" + provider + ".com/" + cache_link.group()[:-1]
+                logger.debug(f"This is the found video link of {provider}: {cache_link}")
+        except AttributeError as e:
+            raise CacheUrlMissing(f"{e}")
+        return cache_link
+    # Eine Weiterleitungsschleife ändert sich durch neue Versuche nicht
+    logger.error(f"Too many VOE redirects, last at {url}.")
+    return 0
+
 # ------------------------------------------------------- #
 #                      classes
 # ------------------------------------------------------- #
 
 
+class CacheUrlMissing(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+
 # ------------------------------------------------------- #
 #                       main
 # ------------------------------------------------------- #
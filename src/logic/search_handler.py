@@ -1,7 +1,8 @@
-import requests
 from thefuzz import process
 from bs4 import BeautifulSoup
 
+from src.logic import http_client
+
 class Search_Handler:
     def __init__(self):
         self.base_url = f"https://aniworld.to/animes"
@@ -17,8 +18,7 @@ class Search_Handler:
             url = self.base_url_sto
         else:
             return None
-        response = requests.get(url)
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = BeautifulSoup(http_client.fetch_html(url), 'html.parser')
         name_list = []
         for name in soup.find_all('div', class_='genre'):
             for a in name.find_all('a'):
@@ -0,0 +1,73 @@
+import threading
+import time
+
+from src.constants import stall_grace, stall_min_rate
+from src.custom_logging import setup_logger
+from src.logic.bandwidth import bandwidth_shaper
+from src.logic.job_control import job_control
+from src.logic.progress import format_bytes, progress_bus
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class StallWatchdog:
+    """
+    Throughput watchdog fed by the progress bus. A watched job whose speed stays below
+    min_rate for grace seconds is flagged as stalled; its copy loops then raise
+    DownloadStalled and the scheduler switches it to the next provider.
+
+    Parameters:
+        min_rate (Integer): bytes per second, 0 disables the watchdog.
+        grace (Float): seconds a job may stay below min_rate.
+    """
+
+    def __init__(self, min_rate=stall_min_rate, grace=stall_grace):
+        self.min_rate = min_rate
+        self.grace = grace
+        self.lock = threading.Lock()
+        self.below_since = {}
+
+    def watch(self, job_id):
+        if not self.min_rate:
+            return
+        with self.lock:
+            self.below_since[job_id] = None
+
+    def unwatch(self, job_id):
+        with self.lock:
+            self.below_since.pop(job_id, None)
+
+    def on_progress(self, event):
+        if event.finished or event.job_id not in self.below_since:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if event.job_id not in self.below_since:
+                return
+            # Ein einzelnes langsames Intervall (z.B. nach einer Pause) zählt erst, wenn es anhält.
+            # Bremst das eigene Bandbreitenlimit unter min_rate, liegt es nicht am Mirror.
+            fair_share = bandwidth_shaper.fair_share()
+            if (event.speed >= self.min_rate or job_control.is_paused(event.job_id)
+                    or (fair_share is not None and fair_share < self.min_rate)):
+                self.below_since[event.job_id] = None
+                return
+            since = self.below_since[event.job_id]
+            if since is None:
+                self.below_since[event.job_id] = now
+                return
+            if now - since < self.grace:
+                return
+            del self.below_since[event.job_id]
+        logger.warning(f"{event.job_id} stalled at {format_bytes(event.speed)}/s for {self.grace}s.")
+        job_control.stall(event.job_id)
+
+
+# ------------------------------------------------------- #
+#                   global variables
+# ------------------------------------------------------- #
+stall_watchdog = StallWatchdog()
+progress_bus.subscribe(stall_watchdog.on_progress)
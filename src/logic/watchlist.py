@@ -0,0 +1,70 @@
+import os
+import sqlite3
+import threading
+import time
+
+from src.constants import watch_state_file
+from src.custom_logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# ------------------------------------------------------- #
+#                      classes
+# ------------------------------------------------------- #
+
+
+class WatchState:
+    """
+    Last seen size of every show on the watchlist: number of seasons, episodes of the
+    newest season and movies. A sync compares against it to fetch only the newest pages.
+    The state is kept per show and language, a language can lag behind another one.
+
+    Parameters:
+        db_path (String): location of the sqlite file.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def _connect(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.row_factory = sqlite3.Row
+            with self.connection:
+                # Die alte Tabelle ohne Sprache lässt sich keiner Sprache zuordnen, die Shows werden neu erfasst
+                self.connection.execute("DROP TABLE IF EXISTS shows")
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS show_states ("
+                    "url TEXT NOT NULL, language TEXT NOT NULL, seasons INTEGER NOT NULL, episodes INTEGER NOT NULL, "
+                    "movies INTEGER, synced_at REAL NOT NULL, PRIMARY KEY (url, language))"
+                )
+        return self.connection
+
+    def get(self, url, language):
+        """
+        Returns:
+            state (sqlite3.Row): seasons, episodes, movies and synced_at, None if the show was never
+                synced in this language.
+        """
+        with self.lock:
+            return self._connect().execute(
+                "SELECT * FROM show_states WHERE url = ? AND language = ?", (url, language)
+            ).fetchone()
+
+    def set(self, url, language, seasons, episodes, movies=None):
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO show_states (url, language, seasons, episodes, movies, synced_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (url, language, seasons, episodes, movies, time.time())
+                )
+
+
+# ------------------------------------------------------- #
+#                   global variables
+# ------------------------------------------------------- #
+watch_state = WatchState(watch_state_file)
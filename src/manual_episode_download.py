@@ -3,7 +3,7 @@ import os
 from src.constants import (episode_override, language, name, output_path,
                            season_override, type_of_media, url, output_root, output_name, cliProvider)
 from src.custom_logging import setup_logger
-from src.logic.downloader import create_new_download_thread
+from src.logic.scheduler import download_scheduler
 from src.logic.language import LanguageError
 from src.logic.search_for_links import (find_cache_url,
                                         get_redirect_link_by_provider, get_year)
@@ -47,6 +47,6 @@ def main():
         logger.info("Episode {} already downloaded.".format(file_name))
     else:
         logger.info("File not downloaded. Downloading: {}".format(file_name))
-        create_new_download_thread(cache_url, file_name, provider)
+        download_scheduler.submit(cache_url, file_name, provider)
     print("Downloads may still be running. Please don't close this Window until its done.")
     print("You will know its done once you see your primary prompt string. Example: C:\\XXX or username@hostname:")
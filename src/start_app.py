@@ -1,19 +1,21 @@
+import json
 import os
-import time
 import subprocess
-from threading import active_count
 from time import sleep
 
-from src.constants import (APP_VERSION, ddos_protection_calc, ddos_wait_timer,
-                           language, name, output_path, season_override,
+from src.constants import (APP_VERSION, language, name, output_path, season_override,
                            site_url, type_of_media, url, dlMode, cliProvider, output_root, output_name,
-                           thread_download_wait_timer, max_download_threads, disable_thread_timer,
-                           episode_override)
+                           episode_override, get_arg)
 from src.custom_logging import setup_logger
-from src.logic.collect_all_seasons_and_episodes import get_episodes, get_season, get_movies
-from src.logic.downloader import already_downloaded, create_new_download_thread
-from src.logic.language import LanguageError
-from src.logic.search_for_links import (find_cache_url, get_redirect_link_by_provider, get_year)
+from src.logic.collect_all_seasons_and_episodes import ShowMetadata
+from src.logic.page_cache import page_cache
+from src.logic.downloader import already_downloaded
+from src.logic.manifest import manifest
+from src.logic.postprocess import post_processor
+from src.logic.journal import DONE, DOWNLOADING, RESOLVED, journal
+from src.logic.resolver import EpisodeJob, cache_url_alive, failover_for, resolve_all
+from src.logic.watchlist import watch_state
+from src.logic.scheduler import download_scheduler
 from src.failures import write_fails
 from src.successes import write_success
 
@@ -35,7 +37,78 @@ def is_ffmpeg_installed():
 def main(args=None):
     if args is None:
         args = {}
-    
+
+    apply_args(args)
+    if args.get("NO_CACHE", get_arg("NO_CACHE")):
+        logger.info("Page cache disabled for this run.")
+        page_cache.enabled = False
+
+    logger.info("-----------------------------------------------------------")
+    logger.info(f"            AnimeSerienScraper {APP_VERSION} started")
+    logger.info("-----------------------------------------------------------")
+
+    check_environment()
+
+    if name == "Name-Goes-Here":
+        logger.error("Name is Default. Please read readme before starting.")
+        exit()
+
+    download_planned(plan_show())
+
+
+def batch(shows, sync=False):
+    """
+    Download several shows in one run. All shows are planned into one job queue first,
+    then resolved on one worker pool and downloaded by the shared scheduler, so neither
+    season nor show boundaries wait for the last download to finish.
+
+    Parameters:
+        shows (List): one dict per show with the same keys main() accepts
+            (TYPE, NAME, LANG, MODE, SEASON, EPISODE, PROVIDER). Missing keys use the defaults.
+        sync (Boolean): only plan what was released since the last sync of each show (watchlist).
+    """
+    defaults = {"TYPE": type_of_media, "LANG": language, "MODE": dlMode, "SEASON": season_override,
+                "EPISODE": episode_override, "PROVIDER": cliProvider}
+    if get_arg("NO_CACHE"):
+        logger.info("Page cache disabled for this run.")
+        page_cache.enabled = False
+
+    logger.info("-----------------------------------------------------------")
+    logger.info(f"            AnimeSerienScraper {APP_VERSION} {'sync' if sync else 'batch'} started")
+    logger.info("-----------------------------------------------------------")
+
+    check_environment()
+
+    requests = []
+    for show_args in shows:
+        if not show_args.get("NAME"):
+            logger.error(f"Skipping batch entry without a name: {show_args}")
+            continue
+        apply_args({**defaults, **show_args})
+        try:
+            show_requests = plan_sync() if sync else plan_show()
+        except Exception as e:
+            logger.error(f"Could not plan {name}: {e}")
+            continue
+        logger.info(f"Planned {len(show_requests)} downloads for {name}.")
+        requests += show_requests
+
+    logger.info(f"Batch planned {len(requests)} downloads for {len(shows)} shows.")
+    download_planned(requests)
+
+
+def load_batch_file(path):
+    """
+    Read the show list of a batch run: a JSON list of objects with the keys of main().
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        shows = json.load(f)
+    if not isinstance(shows, list):
+        raise ValueError(f"Batch file {path} must contain a list of shows.")
+    return shows
+
+
+def apply_args(args):
     # Überschreibe die Konstanten mit den GUI-Argumenten
     global type_of_media, name, language, dlMode, season_override, cliProvider, url, output_name, episode_override
     type_of_media = args.get("TYPE", type_of_media)
@@ -48,12 +121,8 @@ def main(args=None):
     cliProvider = args.get("PROVIDER", cliProvider)
     url = "{}/{}/stream/{}/".format(site_url[type_of_media], type_of_media, name)
 
-    logger.info("-----------------------------------------------------------")
-    logger.info(f"            AnimeSerienScraper {APP_VERSION} started")
-    logger.info("-----------------------------------------------------------")
-
-    ddos_start_value = 0
 
+def check_environment():
     read_check = os.access('DO_NOT_DELETE.txt', os.R_OK)
     if read_check:
         logger.debug("We have Read Permission")
@@ -73,211 +142,216 @@ def main(args=None):
         logger.info("Output folder does not exist. Creating it now.")
         os.makedirs(output_root, exist_ok=True)
 
-    if name == "Name-Goes-Here":
-        logger.error("Name is Default. Please read readme before starting.")
-        exit()
-
     # Check if FFMPEG is installed before even trying to download episodes
     if not is_ffmpeg_installed():
         logger.error("FFMPEG is not installed or could not be run. You can download it at https://ffmpeg.org/")
         exit()
 
+
+def plan_show(skip=frozenset()):
+    """
+    Plan every missing episode and movie of the current show and record them in the journal.
+
+    Parameters:
+        skip (Set): file names that are queued or downloading already. They are left out
+            before already_downloaded() looks at a file another job is still writing.
+
+    Returns:
+        requests (List): (job, site_url, language, provider) tuples for resolve_all.
+    """
+    show = ShowMetadata(url)
+
     # if user wants to download all seasons starting from X it would be X+ so 2+ would be 2,3,4...
     str_season_override = str(season_override)
     if "+" in str_season_override:
         starting_season = int(season_override.replace("+", "")) - 1
         logger.info(f"Starting Season is: {starting_season + 1}")
-        seasons = get_season(url)
+        seasons = show.seasons
     else:
         starting_season = 0
-        if season_override == 0:
+        if str(season_override) == "0":
             logger.info("No Season override detected.")
             if dlMode.lower() == 'movies':
                 seasons = 1
             else:
-                seasons = get_season(url)
+                seasons = show.seasons
             logger.info("We have this many seasons: {}".format(seasons))
         else:
             logger.info("Season Override detected. Override set to: {}".format(season_override))
             seasons = 1
 
-    year = get_year(url)
-    output_path = f"{output_root}/{type_of_media}/{output_name}_({year})"
-    os.makedirs(output_path, exist_ok=True)
+    output_path = show_output_path(show)
+
+    jobs = []
+
+    # Filme gehören keiner Staffel an und werden nur einmal geplant
+    if dlMode.lower() != 'series':
+        season_path_movies = f"{output_path}/Movies"
+        os.makedirs(season_path_movies, exist_ok=True)
+        episode_count_movies = show.movies
+        logger.info("Show has {} Movie(s)/Special(s).".format(episode_count_movies))
+        jobs += plan_movies(season_path_movies, episode_count_movies, skip)
 
-    threadpool = []
+    if dlMode.lower() == 'movies':
+        return journal_jobs(jobs)
 
     for season in range(int(seasons)):
         if season < starting_season:
             continue
         if not starting_season:
-            season = season + 1 if season_override == 0 else season_override
+            season = season + 1 if str(season_override) == "0" else season_override
         else:
             season = season + 1
         season = int(season)
-        if dlMode.lower() == 'movies':
-            season_path_movies = f"{output_path}/Movies"
-            os.makedirs(season_path_movies, exist_ok=True)
-        elif dlMode.lower() == 'series':
-            season_path_series = f"{output_path}/Season {season:02}"
-            os.makedirs(season_path_series, exist_ok=True)
+        season_path_series = f"{output_path}/Season {season:02}"
+        os.makedirs(season_path_series, exist_ok=True)
+
+        episode_count_series = show.episodes(season)
+        logger.info("Season {} has {} Episodes.".format(season, episode_count_series))
+
+        if dlMode.lower() == 'series' and int(episode_override):
+            jobs += plan_episodes(season_path_series, season, [int(episode_override)], skip)
         else:
+            jobs += plan_episodes(season_path_series, season, range(1, int(episode_count_series) + 1), skip)
+
+    return journal_jobs(jobs)
+
+
+def plan_sync():
+    """
+    Plan only the episodes of the current show released since its last sync. A known show
+    costs the show page and the page of its newest season; a show seen for the first time
+    is planned completely.
+
+    Returns:
+        requests (List): (job, site_url, language, provider) tuples for resolve_all.
+    """
+    state = watch_state.get(url, language)
+    show = ShowMetadata(url, use_cache=False)
+    seasons = int(show.seasons)
+    newest_episodes = int(show.episodes(seasons)) if seasons and dlMode.lower() != 'movies' else 0
+    movies = int(show.movies) if dlMode.lower() != 'series' else None
+
+    if state is None:
+        logger.info(f"First sync of {name}. Planning the whole show.")
+        requests = plan_show()
+    else:
+        logger.info(f"{name}: {state['seasons']} season(s) with {state['episodes']} episode(s) in the newest "
+                    f"at the last sync, now {seasons} with {newest_episodes}.")
+        output_path = show_output_path(show)
+        jobs = []
+        if dlMode.lower() != 'movies':
+            for season in range(max(state["seasons"], 1), seasons + 1):
+                first_episode = state["episodes"] + 1 if season == state["seasons"] else 1
+                episode_count = newest_episodes if season == seasons else int(show.episodes(season))
+                if first_episode > episode_count:
+                    continue
+                season_path_series = f"{output_path}/Season {season:02}"
+                os.makedirs(season_path_series, exist_ok=True)
+                jobs += plan_episodes(season_path_series, season, range(first_episode, episode_count + 1))
+        if movies and movies > (state["movies"] or 0):
             season_path_movies = f"{output_path}/Movies"
-            season_path_series = f"{output_path}/Season {season:02}"
             os.makedirs(season_path_movies, exist_ok=True)
-            os.makedirs(season_path_series, exist_ok=True)
-
-        if dlMode.lower() == 'movies':
-            episode_count_movies = get_movies(url)
-            logger.info("Show has {} Movie(s)/Special(s).".format(episode_count_movies))
-        elif dlMode.lower() == 'series':
-            episode_count_series = get_episodes(url, season)
-            logger.info("Season {} has {} Episodes.".format(season, episode_count_series))
-        else:
-            episode_count_movies = get_movies(url)
-            episode_count_series = get_episodes(url, season)
-            logger.info("Show has {} Movies/Specials.".format(episode_count_movies))
-            logger.info("Season {} has {} Episodes.".format(season, episode_count_series))
-
-        if dlMode.lower() == 'movies':
-            for episode in range(int(episode_count_movies)):
-                episode = episode + 1
-                file_name = "{}/{}-{}.mp4".format(season_path_movies, name, episode)
-                logger.info("File name will be: " + file_name)
-                if not already_downloaded(file_name):
-                    link = url + "filme/film-{}".format(episode)
-                    try:
-                        redirect_link, provider = get_redirect_link_by_provider(site_url[type_of_media], link, language, cliProvider)
-                    except LanguageError:
-                        continue
-                    if ddos_start_value < ddos_protection_calc:
-                        logger.debug("Entered DDOS var check and starting new downloader.")
-                        ddos_start_value += 1
-                    else:
-                        logger.info("Started {} Downloads. Waiting for {} Seconds to not trigger DDOS"
-                                    "Protection.".format(ddos_protection_calc, ddos_wait_timer))
-                        time.sleep(ddos_wait_timer)
-                        ddos_start_value = 1
-                    cache_url = find_cache_url(redirect_link, provider)
-                    if cache_url == 0:
-                        logger.error(f"Could not find cache url for {provider} on {season}, {episode}.")
-                        continue
-                    logger.debug("{} Cache URL is: ".format(provider) + cache_url)
-                    threadpool.append(create_new_download_thread(cache_url, file_name, provider))
-        elif dlMode.lower() == 'series':
-            if episode_override:
-                episode = int(episode_override)
-                file_name = "{}/{} - s{:02}e{:02} - {}.mp4".format(season_path_series, name, season, episode, language)
-                logger.info("File name will be: " + file_name)
-                if not already_downloaded(file_name):
-                    link = url + "staffel-{}/episode-{}".format(season, episode)
-                    try:
-                        redirect_link, provider = get_redirect_link_by_provider(site_url[type_of_media], link, language, cliProvider)
-                    except LanguageError:
-                        return
-                    if ddos_start_value < ddos_protection_calc:
-                        logger.debug("Entered DDOS var check and starting new downloader.")
-                        ddos_start_value += 1
-                    else:
-                        logger.info("Started {} Downloads. Waiting for {} Seconds to not trigger DDOS"
-                                    "Protection.".format(ddos_protection_calc, ddos_wait_timer))
-                        time.sleep(ddos_wait_timer)
-                        ddos_start_value = 1
-                    cache_url = find_cache_url(redirect_link, provider)
-                    if cache_url == 0:
-                        logger.error(f"Could not find cache url for {provider} on {season}, {episode}.")
-                        return
-                    logger.debug("{} Cache URL is: ".format(provider) + cache_url)
-                    threadpool.append(create_new_download_thread(cache_url, file_name, provider))
-            else:
-                for episode in range(int(episode_count_series)):
-                    episode = episode + 1
-                    file_name = "{}/{} - s{:02}e{:02} - {}.mp4".format(season_path_series, name, season, episode, language)
-                    logger.info("File name will be: " + file_name)
-                    if not already_downloaded(file_name):
-                        link = url + "staffel-{}/episode-{}".format(season, episode)
-                        try:
-                            redirect_link, provider = get_redirect_link_by_provider(site_url[type_of_media], link, language, cliProvider)
-                        except LanguageError:
-                            continue
-                        if ddos_start_value < ddos_protection_calc:
-                            logger.debug("Entered DDOS var check and starting new downloader.")
-                            ddos_start_value += 1
-                        else:
-                            logger.info("Started {} Downloads. Waiting for {} Seconds to not trigger DDOS"
-                                        "Protection.".format(ddos_protection_calc, ddos_wait_timer))
-                            time.sleep(ddos_wait_timer)
-                            ddos_start_value = 1
-                        cache_url = find_cache_url(redirect_link, provider)
-                        if cache_url == 0:
-                            logger.error(f"Could not find cache url for {provider} on {season}, {episode}.")
-                            continue
-                        logger.debug("{} Cache URL is: ".format(provider) + cache_url)
-                        threadpool.append(create_new_download_thread(cache_url, file_name, provider))
+            jobs += plan_movies(season_path_movies, movies)
+        requests = journal_jobs(jobs)
+
+    # Der Stand wird mit dem Planen gespeichert, fehlgeschlagene Downloads holt --resume nach
+    watch_state.set(url, language, seasons, newest_episodes, movies)
+    return requests
+
+
+def show_output_path(show):
+    output_path = f"{output_root}/{type_of_media}/{output_name}_({show.year})"
+    os.makedirs(output_path, exist_ok=True)
+    return output_path
+
+
+def journal_jobs(jobs):
+    for job in jobs:
+        journal.plan(job, site_url[type_of_media], language, cliProvider)
+    return [(job, site_url[type_of_media], language, cliProvider) for job in jobs]
+
+
+def download_planned(requests):
+    """
+    Resolve the planned jobs and hand every resolved episode to the download scheduler at once.
+    Waits for all downloads, there is no barrier between seasons or shows.
+    """
+    downloads = []
+    settings = {job.file_name: (job_site_url, job_language) for job, job_site_url, job_language, _ in requests}
+    # Episoden werden parallel aufgelöst, fertige Cache-URLs gehen sofort in den Download
+    for job, cache_url, provider in resolve_all(requests):
+        downloads.append(download_scheduler.submit(cache_url, job.file_name, provider,
+                                                   failover=failover_for(job, *settings[job.file_name])))
+
+    download_scheduler.wait(downloads)
+    post_processor.join()
+
+    write_success()
+    write_fails()
+    journal.prune_done()
+
+
+def resume():
+    """
+    Continue the unfinished jobs of the job journal after a crash, reboot or KeyboardInterrupt.
+    Jobs with a cache url that still answers are downloaded right away, all others are resolved again.
+    """
+    logger.info("-----------------------------------------------------------")
+    logger.info(f"            AnimeSerienScraper {APP_VERSION} resuming")
+    logger.info("-----------------------------------------------------------")
+
+    entries = journal.unfinished()
+    if not entries:
+        logger.info("No unfinished jobs in the journal.")
+        return
+    logger.info(f"Resuming {len(entries)} unfinished jobs.")
+
+    downloads = []
+    to_resolve = []
+    for entry in entries:
+        job = EpisodeJob(entry["file_name"], entry["link"], entry["season"], entry["episode"])
+        if already_downloaded(job.file_name):
+            journal.set_state(job.file_name, DONE)
+            continue
+        if entry["state"] in (RESOLVED, DOWNLOADING) and entry["cache_url"] and cache_url_alive(entry["cache_url"]):
+            logger.info(f"Cache URL of {job.file_name} is still valid.")
+            downloads.append(download_scheduler.submit(
+                entry["cache_url"], job.file_name, entry["resolved_provider"],
+                failover=failover_for(job, entry["site_url"], entry["language"])))
         else:
-            for episode in range(int(episode_count_movies)):
-                episode = episode + 1
-                file_name = "{}/{}-{}.mp4".format(season_path_movies, name, episode)
-                logger.info("File name will be: " + file_name)
-                if not already_downloaded(file_name):
-                    link = url + "filme/film-{}".format(episode)
-                    try:
-                        redirect_link, provider = get_redirect_link_by_provider(site_url[type_of_media], link, language, cliProvider)
-                    except LanguageError:
-                        continue
-                    if ddos_start_value < ddos_protection_calc:
-                        logger.debug("Entered DDOS var check and starting new downloader.")
-                        ddos_start_value += 1
-                    else:
-                        logger.info("Started {} Downloads. Waiting for {} Seconds to not trigger DDOS"
-                                    "Protection.".format(ddos_protection_calc, ddos_wait_timer))
-                        time.sleep(ddos_wait_timer)
-                        ddos_start_value = 1
-                    cache_url = find_cache_url(redirect_link, provider)
-                    if cache_url == 0:
-                        logger.error(f"Could not find cache url for {provider} on {season}, {episode}.")
-                        continue
-                    logger.debug("{} Cache URL is: ".format(provider) + cache_url)
-                    threadpool.append(create_new_download_thread(cache_url, file_name, provider))
-            for episode in range(int(episode_count_series)):
-                episode = episode + 1
-                file_name = "{}/{} - s{:02}e{:02} - {}.mp4".format(season_path_series, name, season, episode, language)
-                logger.info("File name will be: " + file_name)
-                if not already_downloaded(file_name):
-                    link = url + "staffel-{}/episode-{}".format(season, episode)
-                    try:
-                        redirect_link, provider = get_redirect_link_by_provider(site_url[type_of_media], link, language, cliProvider)
-                    except LanguageError:
-                        continue
-                    active_threads = active_count()
-                    logger.debug(f"Active Threads START: {active_threads}")
-                    if ddos_start_value < ddos_protection_calc:
-                        logger.debug("Entered DDOS var check and starting new downloader.")
-                        ddos_start_value += 1
-                    else:
-                        logger.info("Started {} Downloads. Waiting for {} Seconds to not trigger DDOS"
-                                    "Protection.".format(ddos_protection_calc, ddos_wait_timer))
-                        time.sleep(ddos_wait_timer)
-                        active_threads = active_count()
-                        if not disable_thread_timer:
-                            while active_threads > max_download_threads:
-                                logger.info(f"Active Threads: {active_threads}. Waiting {thread_download_wait_timer}s "
-                                            f"before checking again if we are under {max_download_threads} threads.")
-                                time.sleep(thread_download_wait_timer)
-                                active_threads = active_count()
-                        logger.debug(f"Resetting DDOS Counter to 1.")
-                        ddos_start_value = 1
-                    cache_url = find_cache_url(redirect_link, provider)
-                    if cache_url == 0:
-                        logger.error(f"Could not find cache url for {provider} on {season}, {episode}.")
-                        continue
-                    logger.debug("{} Cache URL is: ".format(provider) + cache_url)
-                    threadpool.append(create_new_download_thread(cache_url, file_name, provider))
-                    active_threads = active_count()
-                    logger.debug(f"Active Threads STARTED: {active_threads}")
-
-        for thread in threadpool:
-            thread.join()
-
-        write_success()
-        write_fails()
+            to_resolve.append((job, entry["site_url"], entry["language"], entry["provider"]))
+
+    settings = {job.file_name: (job_site_url, job_language) for job, job_site_url, job_language, _ in to_resolve}
+    for job, cache_url, provider in resolve_all(to_resolve):
+        downloads.append(download_scheduler.submit(cache_url, job.file_name, provider,
+                                                   failover=failover_for(job, *settings[job.file_name])))
+
+    download_scheduler.wait(downloads)
+    post_processor.join()
+    write_success()
+    write_fails()
+    journal.prune_done()
+
+
+def plan_movies(season_path_movies, episode_count_movies, skip=frozenset()):
+    jobs = []
+    manifest_entries = manifest.load_directory(season_path_movies)
+    for episode in range(int(episode_count_movies)):
+        episode = episode + 1
+        file_name = "{}/{}-{}.mp4".format(season_path_movies, name, episode)
+        logger.info("File name will be: " + file_name)
+        if file_name not in skip and not already_downloaded(file_name, manifest_entries):
+            jobs.append(EpisodeJob(file_name, url + "filme/film-{}".format(episode), 0, episode))
+    return jobs
+
+
+def plan_episodes(season_path_series, season, episodes, skip=frozenset()):
+    jobs = []
+    manifest_entries = manifest.load_directory(season_path_series)
+    for episode in episodes:
+        file_name = "{}/{} - s{:02}e{:02} - {}.mp4".format(season_path_series, name, season, episode, language)
+        logger.info("File name will be: " + file_name)
+        if file_name not in skip and not already_downloaded(file_name, manifest_entries):
+            jobs.append(EpisodeJob(file_name, url + "staffel-{}/episode-{}".format(season, episode), season, episode))
+    return jobs